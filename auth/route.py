@@ -1,6 +1,6 @@
 from fastapi import APIRouter, status, Depends, Header
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from core.database import get_db
 from auth.services import get_token, get_refresh_token
 
@@ -11,9 +11,9 @@ router = APIRouter(
 )
 
 @router.post("/token", status_code=status.HTTP_200_OK)
-async def authenticate_user(data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def authenticate_user(data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     return await get_token(data=data, db=db)
 
 @router.post("/refresh", status_code=status.HTTP_200_OK)
-async def refresh_access_token(refresh_token: str = Header(), db: Session = Depends(get_db)):
+async def refresh_access_token(refresh_token: str = Header(), db: AsyncSession = Depends(get_db)):
     return await get_refresh_token(token=refresh_token, db=db)
\ No newline at end of file
@@ -1,16 +1,18 @@
+from sqlalchemy import select
 from users.models import UserModel
 from fastapi.exceptions import HTTPException
-from core.security import verify_password
+from core.security import verify_password_async
 from core.config import get_settings
 from datetime import timedelta
 from auth.responses import TokenResponse
-from core.security import create_access_token, create_refresh_token, get_token_payload
+from core.security import create_access_token, create_refresh_token, get_token_payload, user_claims
 
 settings = get_settings()
 
 
 async def get_token(data, db):
-    user = db.query(UserModel).filter(UserModel.email == data.username).first()
+    result = await db.execute(select(UserModel).filter(UserModel.email == data.username))
+    user = result.scalars().first()
 
     if not user:
         raise HTTPException(
@@ -19,7 +21,7 @@ async def get_token(data, db):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    if not verify_password(data.password, user.password):
+    if not await verify_password_async(data.password, user.password):
         raise HTTPException(
             status_code=400,
             detail="Invalid Login Credentials.",
@@ -40,7 +42,8 @@ async def get_refresh_token(token, db):
             detail="Invalid refresh token.",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    user = db.query(UserModel).filter(UserModel.id == user_id).first()
+    result = await db.execute(select(UserModel).filter(UserModel.id == user_id))
+    user = result.scalars().first()
     if not user:
         raise HTTPException(
             status_code=401,
@@ -64,7 +67,8 @@ async def _get_user_token(user: UserModel, refresh_token=None):
 
     access_token_expiry = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
 
-    access_token = await create_access_token(payload, access_token_expiry)
+    # Данные пользователя - только в access-токене: у refresh-токена нет exp
+    access_token = await create_access_token(user_claims(user), access_token_expiry)
     if not refresh_token:
         refresh_token = await create_refresh_token(payload)
     return TokenResponse(
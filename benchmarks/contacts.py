@@ -0,0 +1,59 @@
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from htmls.contacts import contact_extractor  # noqa: E402
+
+# Шаблоны из прежней версии extract_contact_info - для сравнения
+LEGACY_PHONE = r'(?:\+?(\d[\d\s()]*)?(\([\d\s()]+\))?[\d\s()-]+\d|\+?7?\s?\(?(\d{3})\)?[-.\s]?\d{3}[-.\s]?\d{2}[-.\s]?\d{2})'
+LEGACY_EMAIL = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
+LEGACY_ADDRESS = r'(?:\d{1,4}[\s.,-]?[\w\s.,-]{2,}(?:street|st|avenue|ave|road|rd|highway|hwy|square|sq|trail|trl|drive|dr|court|ct|park|pk|lane|ln|boulevard|blvd|circle|cir|plaza|plz|alley|aly|way|wy|point|pt|parkway|pkwy|commune|cm|district|dist|province|prov|region|reg|territory|terr|city|cty|town|tn|village|vlg|municipality|mun|county|cnty|state|st|country|cntry|ул|пр|просп|пер|ш|шоссе|бульв|бульвар|наб|набережн|пл|площ|площадь)\.?\s?[\w\s.-]{2,})(?:\d{1,4}[\s.,-]?[\w\s.,-]{2,})?(?:кв|комн|комната|офис|офис|к|квартира)\.?\s?\d{1,4}\b'
+
+# Патологические входы: длинные серии цифр, пробелов и скобок, текст без @ и т.п.
+CASES = {
+    'digit-paren-runs': lambda n: '1' + '( ' * (n // 2),
+    'digit-space-runs': lambda n: '1' + ' ' * n,
+    'open-parens': lambda n: '(' * n + 'x',
+    'dash-runs': lambda n: '1 ' + '-' * n,
+    'words-no-address': lambda n: ('12 ул Ленина дом ' * (n // 17 + 1))[:n],
+    'dotted-local-part': lambda n: ('a.' * 50 + '@') * (n // 101 + 1),
+    'contacts-text': lambda n: ('Тел. +7 (495) 123-45-67, info@example.ru, 12 ул. Ленина, кв. 7. ' * (n // 64 + 1))[:n],
+}
+
+
+def legacy_extract(text):
+    return {
+        'phone': re.findall(LEGACY_PHONE, text),
+        'email': re.findall(LEGACY_EMAIL, text),
+        'address': re.findall(LEGACY_ADDRESS, text),
+    }
+
+
+def measure(func, text):
+    started = time.perf_counter()
+    func(text)
+    return time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Время извлечения контактов на патологических входах')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[500, 100000, 1000000])
+    parser.add_argument('--legacy-max-size', type=int, default=500, help='прежние шаблоны запускаются только до этого размера')
+    args = parser.parse_args(argv)
+
+    print(f'{"case":<20} {"size":>9} {"extractor, s":>13} {"legacy, s":>10}')
+    for name, make in CASES.items():
+        for size in args.sizes:
+            text = make(size)
+            current = measure(lambda value: contact_extractor.extract(value, budget=float('inf')), text)
+            legacy = measure(legacy_extract, text) if size <= args.legacy_max_size else None
+            legacy = f'{legacy:10.4f}' if legacy is not None else f'{"-":>10}'
+            print(f'{name:<20} {size:>9} {current:13.4f} {legacy}')
+
+
+if __name__ == '__main__':
+    main()
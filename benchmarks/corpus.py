@@ -0,0 +1,148 @@
+import argparse
+import os
+import random
+
+# Набор тегов документа: контейнеры, в которые вкладываются блоки, и листья с текстом.
+# semantic - разметка, проходящая критерии; divs - вёрстка на div, которую
+# исправляет analyze_html; mixed - и то, и другое.
+CONTAINERS = {
+    'semantic': ['section', 'article', 'aside', 'main', 'header', 'footer', 'nav', 'ul'],
+    'divs': ['div class="header"', 'div class="navbar"', 'div id="content"', 'div class="footer"', 'div class="row"', 'div'],
+}
+CONTAINERS['mixed'] = CONTAINERS['semantic'] + CONTAINERS['divs']
+
+LEAVES = {
+    'semantic': [
+        '<h2>{words}</h2>',
+        '<p>{words} <abbr title="{word}">{word}</abbr> {words}</p>',
+        '<figure><img src="/{word}.png" alt="{word}"><figcaption>{words}</figcaption></figure>',
+        '<table><caption>{word}</caption><tr><th>{word}</th><th>{word}</th></tr><tr><td>{words}</td><td>{word}</td></tr></table>',
+        '<blockquote><p>{words}</p><cite>{word}</cite></blockquote>',
+        '<p>{words} <time datetime="2024-01-01">{word}</time> <mark>{word}</mark></p>',
+        '<details><summary>{word}</summary><p>{words}</p></details>',
+    ],
+    'divs': [
+        '<div class="title">{words}</div>',
+        '<p>{words} <abbr>{word}</abbr> {words}</p>',
+        '<figure><img src="/{word}.png"></figure>',
+        '<table><tr><td>{words}</td><td>{word}</td></tr></table>',
+        '<div><span>{words}</span> <b>{word}</b></div>',
+        '<p>{words}</p>',
+    ],
+}
+LEAVES['mixed'] = LEAVES['semantic'] + LEAVES['divs']
+TAG_MIXES = tuple(CONTAINERS)
+
+WORDS = (
+    'разметка документ страница контент заголовок раздел lorem ipsum dolor sit amet '
+    'consectetur adipiscing elit sed do eiusmod tempor incididunt labore'
+).split()
+
+CONTACTS = [
+    'Тел. +7 (495) {d3}-{d2}-{d2}',
+    'пишите на {word}{d2}@example.ru',
+    '{d2} ул. Ленина, кв. {d2}',
+    'phone: 8 800 {d3} {d2} {d2}',
+]
+
+# Кодировки, в которых документ можно закодировать без потерь (текст содержит кириллицу)
+ENCODINGS = ('utf-8', 'utf-8-sig', 'windows-1251', 'koi8-r', 'utf-16')
+
+
+class DocumentGenerator:
+    # Синтетический HTML-документ заданного размера. Документ собирается из
+    # блоков: цепочка из depth вложенных контейнеров, внутри - несколько листьев.
+    # contact_density - доля листьев, в текст которых добавляются телефон, email
+    # или адрес. Генератор детерминирован при одном и том же seed.
+
+    def __init__(self, size=50000, depth=6, tag_mix='mixed', contact_density=0.05, encoding='utf-8', seed=0):
+        if tag_mix not in CONTAINERS:
+            raise ValueError(f'Неизвестный набор тегов: {tag_mix}')
+        self.size = size
+        self.depth = depth
+        self.tag_mix = tag_mix
+        self.contact_density = contact_density
+        self.encoding = encoding
+        self.random = random.Random(seed)
+
+    def words(self, count):
+        return ' '.join(self.random.choice(WORDS) for _ in range(count))
+
+    def leaf(self):
+        words = self.words(self.random.randint(4, 16))
+        if self.random.random() < self.contact_density:
+            contact = self.random.choice(CONTACTS).format(
+                d2=self.random.randint(10, 99),
+                d3=self.random.randint(100, 999),
+                word=self.random.choice(WORDS),
+            )
+            words = f'{words} {contact}'
+        return self.random.choice(LEAVES[self.tag_mix]).format(words=words, word=self.random.choice(WORDS))
+
+    def block(self):
+        containers = [self.random.choice(CONTAINERS[self.tag_mix]) for _ in range(self.depth)]
+        opening = ''.join(f'<{container}>' for container in containers)
+        closing = ''.join(f'</{container.split()[0]}>' for container in reversed(containers))
+        leaves = ''.join(self.leaf() for _ in range(self.random.randint(1, 4)))
+        return f'{opening}{leaves}{closing}\n'
+
+    def text(self):
+        # Размер считается в символах текста; в байтах он зависит от кодировки
+        charset = self.encoding.replace('-sig', '')
+        head = f'<!DOCTYPE html>\n<html lang="ru"><head><meta charset="{charset}"><title>{self.words(3)}</title></head><body>\n'
+        tail = '</body></html>\n'
+        blocks = []
+        length = len(head) + len(tail)
+        while length < self.size:
+            block = self.block()
+            blocks.append(block)
+            length += len(block)
+        return head + ''.join(blocks) + tail
+
+    def generate(self):
+        return self.text().encode(self.encoding)
+
+
+def generate_document(size=50000, depth=6, tag_mix='mixed', contact_density=0.05, encoding='utf-8', seed=0):
+    return DocumentGenerator(size, depth, tag_mix, contact_density, encoding, seed).generate()
+
+
+def generate_corpus(count, seed=0, **params):
+    # count документов с одними параметрами, но разным содержимым
+    return [generate_document(seed=seed + number, **params) for number in range(count)]
+
+
+def write_corpus(directory, count, seed=0, **params):
+    # Корпус в виде каталога *.html - вход для mark_files
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for number, data in enumerate(generate_corpus(count, seed, **params)):
+        path = os.path.join(directory, f'doc-{number:05d}.html')
+        with open(path, 'wb') as f:
+            f.write(data)
+        paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Генерация синтетического корпуса HTML-документов')
+    parser.add_argument('directory')
+    parser.add_argument('--count', type=int, default=100)
+    parser.add_argument('--size', type=int, default=50000, help='размер документа в символах')
+    parser.add_argument('--depth', type=int, default=6, help='глубина вложенности контейнеров')
+    parser.add_argument('--tag-mix', choices=TAG_MIXES, default='mixed')
+    parser.add_argument('--contact-density', type=float, default=0.05, help='доля текстовых блоков с контактами')
+    parser.add_argument('--encoding', choices=ENCODINGS, default='utf-8')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    paths = write_corpus(
+        args.directory, args.count, args.seed,
+        size=args.size, depth=args.depth, tag_mix=args.tag_mix,
+        contact_density=args.contact_density, encoding=args.encoding,
+    )
+    print(f'Written {len(paths)} files to {args.directory}')
+
+
+if __name__ == '__main__':
+    main()
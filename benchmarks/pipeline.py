@@ -0,0 +1,226 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.corpus import ENCODINGS, TAG_MIXES, generate_corpus, write_corpus  # noqa: E402
+
+# Сценарии по умолчанию: параметры генератора, число документов и что измеряется -
+# analyze_html по стадиям (analyze) или разметка корпуса целиком (mark)
+SCENARIOS = {
+    'small': {'size': 5000, 'documents': 200},
+    'medium': {'size': 50000, 'documents': 40},
+    'large': {'size': 500000, 'documents': 5},
+    'deep': {'size': 50000, 'depth': 40, 'documents': 40},
+    'divs': {'size': 50000, 'tag_mix': 'divs', 'documents': 40},
+    'contacts': {'size': 50000, 'contact_density': 0.5, 'documents': 40},
+    'windows-1251': {'size': 50000, 'encoding': 'windows-1251', 'documents': 40},
+    'mark': {'kind': 'mark', 'size': 50000, 'documents': 100, 'workers': 1},
+}
+GENERATOR_PARAMS = ('size', 'depth', 'tag_mix', 'contact_density', 'encoding')
+STAGES = ('parse', 'index', 'criteria', 'locations', 'correction', 'serialization')
+
+
+def peak_rss():
+    # Пиковый RSS процесса и его завершившихся дочерних процессов, в байтах
+    # (ru_maxrss в Linux - в килобайтах, в macOS - в байтах)
+    scale = 1 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) * scale
+
+
+def run_pipeline(data, output='prettified'):
+    # Время стадий analyze_html и каждого критерия (criterion.<id>) для одного документа
+    from core.metrics import Timings
+    from htmls.process_html import analyze_html
+
+    timings = Timings()
+    analyze_html(data, output=output, timings=timings)
+    return timings.durations
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        'total': sum(samples),
+        'mean': sum(samples) / len(samples),
+        'p50': samples[len(samples) // 2],
+        'p95': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        'max': samples[-1],
+    }
+
+
+def throughput(documents, size, seconds):
+    return {
+        'documents': documents,
+        'bytes': size,
+        'seconds': seconds,
+        'docs_per_second': documents / seconds if seconds else None,
+        'mb_per_second': size / 1e6 / seconds if seconds else None,
+    }
+
+
+def bench_analyze(corpus, repeat, output):
+    # Первый документ прогоняется без замера: импорты, компиляция шаблонов
+    run_pipeline(corpus[0], output)
+
+    samples = {}
+    for _ in range(repeat):
+        for data in corpus:
+            for stage, seconds in run_pipeline(data, output).items():
+                samples.setdefault(stage, []).append(seconds)
+
+    documents = len(corpus) * repeat
+    size = sum(map(len, corpus)) * repeat
+    totals = [sum(durations) for durations in zip(*(samples[stage] for stage in STAGES))]
+    return {
+        **throughput(documents, size, sum(totals)),
+        'per_document': summarize(totals),
+        'stages': {stage: summarize(samples[stage]) for stage in STAGES},
+        'criteria': {
+            stage[len('criterion.'):]: summarize(stage_samples)
+            for stage, stage_samples in samples.items() if stage.startswith('criterion.')
+        },
+    }
+
+
+def bench_mark(corpus_params, documents, workers):
+    from htmls.mark_dataset import mark_files
+
+    with tempfile.TemporaryDirectory() as directory:
+        corpus_dir = Path(directory) / 'corpus'
+        paths = write_corpus(str(corpus_dir), documents, **corpus_params)
+        size = sum(Path(path).stat().st_size for path in paths)
+
+        started = time.perf_counter()
+        # mark_files печатает прогресс по каждому файлу - в замер он не нужен
+        with contextlib.redirect_stdout(io.StringIO()):
+            mark_files(str(corpus_dir), str(Path(directory) / 'marked.csv'), workers=workers)
+        seconds = time.perf_counter() - started
+
+    return throughput(documents, size, seconds)
+
+
+def run_scenario(name, scenario, repeat, output):
+    # Выполняется в отдельном процессе, чтобы пиковый RSS относился к одному сценарию
+    params = {key: scenario[key] for key in GENERATOR_PARAMS if key in scenario}
+    documents = scenario['documents']
+
+    if scenario.get('kind') == 'mark':
+        result = bench_mark(params, documents, scenario.get('workers', 1))
+    else:
+        corpus = generate_corpus(documents, **params)
+        result = bench_analyze(corpus, repeat, output)
+
+    return {'name': name, **scenario, 'output': output, **result, 'peak_rss_bytes': peak_rss()}
+
+
+def run_isolated(name, scenario, repeat, output):
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        return pool.apply(run_scenario, (name, scenario, repeat, output))
+
+
+def environment():
+    from core.config import get_settings
+
+    settings = get_settings()
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'html_parser': settings.HTML_PARSER,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    }
+
+
+def compare(report, baseline, max_regression=None):
+    # Отношение текущего времени к базовому по каждому сценарию и стадии;
+    # регрессия - если отношение больше 1 + max_regression
+    previous = {scenario['name']: scenario for scenario in baseline['scenarios']}
+    regressions = []
+
+    print(f'{"scenario":<14} {"metric":<15} {"baseline, ms":>13} {"current, ms":>12} {"ratio":>7}')
+    for scenario in report['scenarios']:
+        old = previous.get(scenario['name'])
+        if old is None:
+            continue
+
+        metrics = [('total', old['seconds'] / old['documents'], scenario['seconds'] / scenario['documents'])]
+        for stage, stats in scenario.get('stages', {}).items():
+            if stage in old.get('stages', {}):
+                metrics.append((stage, old['stages'][stage]['mean'], stats['mean']))
+
+        for metric, old_value, value in metrics:
+            ratio = value / old_value if old_value else float('inf')
+            flag = ''
+            if max_regression is not None and ratio > 1 + max_regression:
+                regressions.append((scenario['name'], metric, ratio))
+                flag = ' !'
+            print(f'{scenario["name"]:<14} {metric:<15} {old_value * 1000:13.3f} {value * 1000:12.3f} {ratio:7.2f}{flag}')
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Замеры analyze_html и mark_files на синтетическом корпусе')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--documents', type=int, help='число документов в каждом сценарии')
+    parser.add_argument('--repeat', type=int, default=1, help='сколько раз прогонять корпус в сценариях analyze')
+    parser.add_argument('--output-mode', choices=('prettified', 'minimal', 'patch'), default='prettified')
+    parser.add_argument('--size', type=int, help='свой сценарий custom: размер документа в символах')
+    parser.add_argument('--depth', type=int, default=6)
+    parser.add_argument('--tag-mix', choices=TAG_MIXES, default='mixed')
+    parser.add_argument('--contact-density', type=float, default=0.05)
+    parser.add_argument('--encoding', choices=ENCODINGS, default='utf-8')
+    parser.add_argument('--json', help='куда записать отчёт в JSON')
+    parser.add_argument('--baseline', help='отчёт прошлого запуска для сравнения')
+    parser.add_argument('--max-regression', type=float, help='допустимый рост времени, например 0.1 - на 10%%')
+    args = parser.parse_args(argv)
+
+    scenarios = {name: dict(SCENARIOS[name]) for name in args.scenarios}
+    if args.size is not None:
+        scenarios = {'custom': {
+            'size': args.size, 'depth': args.depth, 'tag_mix': args.tag_mix,
+            'contact_density': args.contact_density, 'encoding': args.encoding, 'documents': 20,
+        }}
+    if args.documents is not None:
+        for scenario in scenarios.values():
+            scenario['documents'] = args.documents
+
+    report = {'environment': environment(), 'scenarios': []}
+    print(f'{"scenario":<14} {"docs":>6} {"docs/s":>9} {"MB/s":>8} {"peak RSS, MB":>13}')
+    for name, scenario in scenarios.items():
+        result = run_isolated(name, scenario, args.repeat, args.output_mode)
+        report['scenarios'].append(result)
+        print(
+            f'{name:<14} {result["documents"]:>6} {result["docs_per_second"]:9.1f} '
+            f'{result["mb_per_second"]:8.2f} {result["peak_rss_bytes"] / 2 ** 20:13.1f}'
+        )
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print()
+        regressions = compare(report, baseline, args.max_regression)
+        if regressions:
+            print(f'{len(regressions)} regression(s) over {args.max_regression:.0%}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
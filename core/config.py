@@ -15,11 +15,62 @@ class Settings(BaseSettings):
     DB_HOST: str = os.getenv('DB_SERVER')
     DB_PORT: str = os.getenv('DB_PORT')
     DATABASE_URL: str = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    ASYNC_DATABASE_URL: str = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    DB_POOL_SIZE: int = os.getenv('DB_POOL_SIZE', 5)
+    DB_MAX_OVERFLOW: int = os.getenv('DB_MAX_OVERFLOW', 0)
 
     # JWT
     JWT_SECRET: str = os.getenv('JWT_SECRET')
     JWT_ALGORITHM: str = os.getenv('JWT_ALGORITHM')
     ACCESS_TOKEN_EXPIRE_MINUTES: int = os.getenv('JWT_TOKEN_EXPIRE_MINUTES', 60)
+    JWT_CACHE_MAX_SIZE: int = os.getenv('JWT_CACHE_MAX_SIZE', 10000)
+    # Брать пользователя из claims access-токена без запроса к БД: изменения
+    # пользователя (в том числе is_active) видны только в новых токенах
+    JWT_TRUST_CLAIMS: bool = os.getenv('JWT_TRUST_CLAIMS', False)
+
+    # Password hashing
+    PASSWORD_HASH_WORKERS: int = os.getenv('PASSWORD_HASH_WORKERS', 2)
+    PASSWORD_HASH_QUEUE_SIZE: int = os.getenv('PASSWORD_HASH_QUEUE_SIZE', 16)
+
+    # Authenticated user cache
+    USER_CACHE_TTL_SECONDS: int = os.getenv('USER_CACHE_TTL_SECONDS', 60)
+    USER_CACHE_MAX_SIZE: int = os.getenv('USER_CACHE_MAX_SIZE', 10000)
+
+    # HTML
+    HTML_PARSER: str = os.getenv('HTML_PARSER', 'html.parser')  # html.parser | lxml | html5lib
+    HTML_SCORING_ENGINE: str = os.getenv('HTML_SCORING_ENGINE', 'soup')  # soup | selectolax
+    CONTACT_EXTRACTION_BUDGET_SECONDS: float = os.getenv('CONTACT_EXTRACTION_BUDGET_SECONDS', 0.5)
+
+    # Analysis workers
+    ANALYSIS_WORKERS: int = os.getenv('ANALYSIS_WORKERS', os.cpu_count() or 1)
+    ANALYSIS_QUEUE_SIZE: int = os.getenv('ANALYSIS_QUEUE_SIZE', 32)
+    ANALYSIS_TIMEOUT_SECONDS: float = os.getenv('ANALYSIS_TIMEOUT_SECONDS', 30)
+
+    # Analysis instrumentation
+    ANALYSIS_SERVER_TIMING: bool = os.getenv('ANALYSIS_SERVER_TIMING', False)  # заголовок Server-Timing в ответе
+    ANALYSIS_PROFILE_SAMPLE_RATE: int = os.getenv('ANALYSIS_PROFILE_SAMPLE_RATE', 0)  # профилировать 1 из N, 0 - нет
+    ANALYSIS_PROFILE_DIR: str = os.getenv('ANALYSIS_PROFILE_DIR', 'profiles')
+
+    # Uploads
+    UPLOAD_MAX_BYTES: int = os.getenv('UPLOAD_MAX_BYTES', 10 * 1024 * 1024)
+    UPLOAD_SPOOL_BYTES: int = os.getenv('UPLOAD_SPOOL_BYTES', 1024 * 1024)
+    BATCH_MAX_BYTES: int = os.getenv('BATCH_MAX_BYTES', 100 * 1024 * 1024)
+
+    # Batch uploads
+    BATCH_MAX_FILES: int = os.getenv('BATCH_MAX_FILES', 500)
+
+    # Background jobs
+    JOB_TTL_SECONDS: int = os.getenv('JOB_TTL_SECONDS', 3600)
+    JOB_STALE_SECONDS: int = os.getenv('JOB_STALE_SECONDS', 120)
+    JOB_SWEEP_INTERVAL_SECONDS: int = os.getenv('JOB_SWEEP_INTERVAL_SECONDS', 60)
+    JOB_SPOOL_DIR: str = os.getenv('JOB_SPOOL_DIR', 'job_spool')
+    JOB_ANALYSIS_TIMEOUT_SECONDS: float = os.getenv('JOB_ANALYSIS_TIMEOUT_SECONDS', 600)  # на документ, 0 - без срока
+
+    # Analysis result cache
+    ANALYSIS_CACHE_MAX_BYTES: int = os.getenv('ANALYSIS_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+    ANALYSIS_CACHE_PATH: str = os.getenv('ANALYSIS_CACHE_PATH', '')  # пусто - без дискового уровня
+    ANALYSIS_CACHE_DISK_MAX_BYTES: int = os.getenv('ANALYSIS_CACHE_DISK_MAX_BYTES', 1024 * 1024 * 1024)
+    ANALYSIS_CACHE_TTL_SECONDS: int = os.getenv('ANALYSIS_CACHE_TTL_SECONDS', 7 * 24 * 3600)  # 0 - без срока
 
 
 def get_settings() -> Settings:
@@ -1,27 +1,46 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from typing import Generator
+import time
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from typing import AsyncGenerator
 from core.config import get_settings
+from core.metrics import metrics
 
 settings = get_settings()
 
-engine = create_engine(
-    settings.DATABASE_URL,
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    # Пул соединений, замеряющий ожидание свободного соединения при checkout
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe('db_pool_checkout_seconds', time.perf_counter() - started)
+
+
+engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL,
+    poolclass=TimedQueuePool,
     pool_pre_ping=True,
     pool_recycle=300,
-    pool_size=5,
-    max_overflow=0
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: объекты остаются читаемыми после коммита и закрытия сессии
+metrics.describe('db_pool_checkout_seconds', 'Ожидание соединения из пула БД')
+metrics.collect('db_pool_connections', 'gauge', 'Соединения пула БД', lambda: [
+    ({'state': 'checked_out'}, engine.pool.checkedout()),
+    ({'state': 'idle'}, engine.pool.checkedin()),
+    ({'state': 'overflow'}, max(engine.pool.overflow(), 0)),
+])
+
+SessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 
-def get_db() -> Generator:
-    db = SessionLocal()
-    try:
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
-
-
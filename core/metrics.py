@@ -0,0 +1,225 @@
+import cProfile
+import itertools
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from core.config import get_settings
+
+settings = get_settings()
+
+# Границы корзин гистограмм длительности, в секундах
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Timings:
+    # Длительности стадий одного вызова, в секундах, в порядке их выполнения.
+    # Повторная стадия с тем же именем суммируется.
+
+    def __init__(self):
+        self.durations = {}
+
+    def add(self, name, seconds):
+        self.durations[name] = self.durations.get(name, 0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+
+class Histogram:
+    # Накопительная гистограмма: число наблюдений в каждой корзине, их сумма и количество
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        # Пары (верхняя граница, число наблюдений не больше неё); последняя граница - +Inf
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+
+class MetricsRegistry:
+    # Метрики процесса по имени и набору меток: гистограммы, счётчики и функции,
+    # значения которых (размеры очередей, пула и т.п.) читаются в момент запроса
+    # /metrics. Все изменения выполняются в потоке event loop, поэтому обычных
+    # целых и списков достаточно - без блокировок. Воркеры анализа передают свои
+    # данные вместе с результатом, а в реестр их записывает основной процесс.
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.collectors = {}
+        self.descriptions = {}
+
+    def describe(self, name, description):
+        self.descriptions[name] = description
+
+    def histogram(self, name, buckets=DEFAULT_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(buckets)
+        return histogram
+
+    def observe(self, name, value, **labels):
+        self.histogram(name, **labels).observe(value)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def collect(self, name, kind, description, func):
+        # func() -> [(метки, значение), ...]; kind - gauge или counter
+        self.collectors[name] = (kind, func)
+        self.describe(name, description)
+
+    def render(self):
+        # Текстовый формат Prometheus (text/plain; version=0.0.4)
+        families = {}
+        for (name, labels), histogram in self.histograms.items():
+            lines = families.setdefault(name, ('histogram', []))[1]
+            for bound, count in histogram.cumulative():
+                lines.append(_sample(f'{name}_bucket', labels + (('le', _number(bound)),), count))
+            lines.append(_sample(f'{name}_sum', labels, histogram.sum))
+            lines.append(_sample(f'{name}_count', labels, histogram.count))
+
+        for (name, labels), value in self.counters.items():
+            families.setdefault(name, ('counter', []))[1].append(_sample(name, labels, value))
+
+        for name, (kind, func) in self.collectors.items():
+            lines = families.setdefault(name, (kind, []))[1]
+            for labels, value in func():
+                lines.append(_sample(name, tuple(sorted(labels.items())), value))
+
+        output = []
+        for name, (kind, lines) in sorted(families.items()):
+            if name in self.descriptions:
+                output.append(f'# HELP {name} ' + self.descriptions[name].replace('\\', '\\\\').replace('\n', '\\n'))
+            output.append(f'# TYPE {name} {kind}')
+            output.extend(lines)
+        return '\n'.join(output) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _sample(name, labels, value):
+    if not labels:
+        return f'{name} {_number(value)}'
+    pairs = ','.join(f'{label}="{_escape(label_value)}"' for label, label_value in labels)
+    return f'{name}{{{pairs}}} {_number(value)}'
+
+
+metrics = MetricsRegistry()
+metrics.describe('analysis_stage_seconds', 'Время стадий анализа HTML')
+metrics.describe('analysis_criterion_seconds', 'Время проверки каждого критерия')
+metrics.describe('http_request_duration_seconds', 'Время обработки HTTP-запросов по маршрутам')
+
+
+def observe_timings(timings):
+    # Стадии и критерии анализа одного документа - в гистограммы
+    for name, seconds in timings.items():
+        if name.startswith('criterion.'):
+            metrics.observe('analysis_criterion_seconds', seconds, criterion=name[len('criterion.'):])
+        else:
+            metrics.observe('analysis_stage_seconds', seconds, stage=name)
+
+
+def server_timing(timings):
+    # Значение заголовка Server-Timing: имя;dur=миллисекунды через запятую
+    return ', '.join(f'{name};dur={seconds * 1000:.2f}' for name, seconds in timings.items())
+
+
+class ProfileSampler:
+    # Решает, какой запрос профилировать: каждый rate-й, 0 - профилирование выключено.
+    # Решение принимается в основном процессе, поэтому доля точна при любом числе воркеров.
+
+    def __init__(self, rate, directory):
+        self.rate = rate
+        self.directory = directory
+        self.calls = 0
+
+    def sample(self):
+        # Каталог для профиля, если этот вызов нужно профилировать, иначе None
+        if not self.rate:
+            return None
+        self.calls += 1
+        return self.directory if self.calls % self.rate == 0 else None
+
+
+_profile_numbers = itertools.count(1)
+
+
+@contextmanager
+def profiled(directory, name):
+    # cProfile на время блока; профиль пишется в directory/<время>-<pid>-<номер>-<name>.prof
+    # и открывается pstats, snakeviz и т.п.
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(directory, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        profiler.dump_stats(os.path.join(directory, f'{stamp}-{os.getpid()}-{next(_profile_numbers)}-{name}.prof'))
+
+
+profile_sampler = ProfileSampler(settings.ANALYSIS_PROFILE_SAMPLE_RATE, settings.ANALYSIS_PROFILE_DIR)
+
+
+class MetricsMiddleware:
+    # Время каждого HTTP-запроса по методу, шаблону маршрута и статусу.
+    # Шаблон (/jobs/{job_id}) берётся из scope после маршрутизации, поэтому
+    # число меток не растёт с числом разных URL
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get('route')
+            metrics.observe(
+                'http_request_duration_seconds',
+                time.perf_counter() - started,
+                method=scope['method'],
+                route=getattr(route, 'path', 'unmatched'),
+                status=str(status),
+            )
@@ -1,3 +1,8 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from starlette.authentication import AuthCredentials, UnauthenticatedUser
@@ -5,7 +10,10 @@ from datetime import timedelta, datetime
 from jose import jwt, JWTError
 from core.config import get_settings
 from fastapi import Depends
-from core.database import get_db
+from fastapi.exceptions import HTTPException
+from sqlalchemy import event, select
+from core.database import SessionLocal
+from core.metrics import metrics
 from users.models import UserModel
 
 settings = get_settings()
@@ -14,6 +22,95 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
 
+class UserCache:
+    # Кэш пользователей для middleware: по id, с TTL и ограничением размера.
+    # Объекты отсоединены от сессии и используются только для чтения.
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def get(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+
+        expires_at, user = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            return None
+
+        self._entries.move_to_end(user_id)
+        return user
+
+    def set(self, user_id, user):
+        self._entries[user_id] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        self._entries.pop(user_id, None)
+
+
+user_cache = UserCache(ttl=settings.USER_CACHE_TTL_SECONDS, max_size=settings.USER_CACHE_MAX_SIZE)
+
+
+class TokenCache:
+    # Проверенные токены: sha256 токена -> payload. Подпись проверяется один раз,
+    # а запись живёт до exp токена (токен без exp - пока не вытеснена по LRU).
+    # Попадают сюда только токены, прошедшие проверку подписи.
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, payload = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return payload
+
+    def set(self, key, payload):
+        expires_at = payload.get('exp')
+        self._entries[key] = (expires_at if isinstance(expires_at, (int, float)) else None, payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+token_cache = TokenCache(max_size=settings.JWT_CACHE_MAX_SIZE)
+metrics.collect('auth_token_cache_requests_total', 'counter', 'Обращения к кэшу проверенных JWT', lambda: [
+    ({'result': 'hit'}, token_cache.hits),
+    ({'result': 'miss'}, token_cache.misses),
+])
+
+
+def invalidate_user(user_id):
+    # Для массовых UPDATE в обход ORM, где события маппера не срабатывают
+    user_cache.invalidate(user_id)
+
+
+@event.listens_for(UserModel, 'after_update')
+@event.listens_for(UserModel, 'after_delete')
+def _invalidate_cached_user(mapper, connection, target):
+    # Любое изменение пользователя (в том числе is_active) сбрасывает его копию в кэше
+    user_cache.invalidate(target.id)
+
+
 def get_password_hash(password):
     return pwd_context.hash(password)
 
@@ -22,6 +119,82 @@ def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 
+class PasswordHasher:
+    # Отдельный небольшой пул потоков для bcrypt: каждая операция - около 250 мс CPU,
+    # и в event loop она останавливала бы весь воркер. bcrypt отпускает GIL,
+    # поэтому потоков достаточно. Очередь ограничена: при наплыве логинов
+    # лишние запросы сразу получают 503, а не копятся.
+
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hasher')
+
+    @property
+    def running(self):
+        return min(self.in_flight, self.workers)
+
+    @property
+    def queued(self):
+        return max(self.in_flight - self.workers, 0)
+
+    def _release(self, future):
+        self.in_flight -= 1
+        if future.cancelled() or future.exception() is not None:
+            self.failed += 1
+        else:
+            self.completed += 1
+
+    async def run(self, func, *args):
+        if self.in_flight >= self.workers + self.queue_size:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Too many authentication requests. Please try again later.",
+                headers={"Retry-After": "1"},
+            )
+
+        # Слот освобождается, когда поток действительно закончил bcrypt, а не когда
+        # ожидающий запрос отменён: иначе при отменах лимит можно превысить
+        future = asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        self.in_flight += 1
+        future.add_done_callback(self._release)
+        return await asyncio.shield(future)
+
+    def stats(self):
+        return {
+            'running': self.running,
+            'queued': self.queued,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+        }
+
+
+password_hasher = PasswordHasher(workers=settings.PASSWORD_HASH_WORKERS, queue_size=settings.PASSWORD_HASH_QUEUE_SIZE)
+metrics.collect('password_hash_tasks', 'gauge', 'Операции bcrypt в работе и в очереди', lambda: [
+    ({'state': 'running'}, password_hasher.running),
+    ({'state': 'queued'}, password_hasher.queued),
+])
+metrics.collect('password_hash_total', 'counter', 'Завершённые, упавшие и отклонённые операции bcrypt', lambda: [
+    ({'outcome': 'completed'}, password_hasher.completed),
+    ({'outcome': 'failed'}, password_hasher.failed),
+    ({'outcome': 'rejected'}, password_hasher.rejected),
+])
+
+
+async def hash_password_async(password):
+    return await password_hasher.run(get_password_hash, password)
+
+
+async def verify_password_async(plain_password, hashed_password):
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
+
 async def create_access_token(data, expiry: timedelta):
     payload = data.copy()
     expire_in = datetime.utcnow() + expiry
@@ -34,14 +207,47 @@ async def create_refresh_token(data):
 
 
 def get_token_payload(token):
+    key = hashlib.sha256(token.encode('utf-8')).digest()
+    payload = token_cache.get(key)
+    if payload is not None:
+        return payload
+
     try:
         payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
     except JWTError:
         return None
+
+    if type(payload) is dict:
+        token_cache.set(key, payload)
     return payload
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db=None):
+def user_claims(user):
+    # Данные пользователя для access-токена; используются при JWT_TRUST_CLAIMS
+    return {
+        'id': user.id,
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'is_active': user.is_active,
+        'registered_at': user.registered_at.isoformat() if user.registered_at else None,
+    }
+
+
+class TokenUser:
+    # Пользователь, восстановленный из claims токена, без обращения к БД.
+    # Только для чтения: поля те же, что у UserModel в ответах API.
+
+    def __init__(self, payload):
+        self.id = payload['id']
+        self.email = payload.get('email')
+        self.first_name = payload.get('first_name')
+        self.last_name = payload.get('last_name')
+        self.is_active = payload['is_active']
+        self.registered_at = payload.get('registered_at')
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db=None):
     payload = get_token_payload(token)
     if not payload or type(payload) is not dict:
         return None
@@ -50,26 +256,60 @@ def get_current_user(token: str = Depends(oauth2_scheme), db=None):
     if not user_id:
         return None
 
-    if not db:
-        db = next(get_db())
+    # Доверяем claims только access-токенам с exp и данными пользователя:
+    # токены, выданные раньше, по-прежнему проверяются по БД
+    if settings.JWT_TRUST_CLAIMS and 'exp' in payload and 'is_active' in payload:
+        return TokenUser(payload) if payload['is_active'] else None
 
-    user = db.query(UserModel).filter(UserModel.id == user_id).first()
+    user = user_cache.get(user_id)
+    if user:
+        return user
+
+    if db:
+        user = await _get_user(db, user_id)
+    else:
+        async with SessionLocal() as db:
+            user = await _get_user(db, user_id)
+
+    if user:
+        user_cache.set(user_id, user)
     return user
 
 
+async def _get_user(db, user_id):
+    result = await db.execute(select(UserModel).filter(UserModel.id == user_id))
+    return result.scalars().first()
+
+
+# Токены длиннее заведомо не выданы этим сервисом
+MAX_TOKEN_LENGTH = 4096
+
+
+def bearer_token(header):
+    # Токен из заголовка "Authorization: Bearer <JWT>" или None, если заголовок
+    # отсутствует или не похож на JWT - до декодирования и проверки подписи
+    if not header:
+        return None
+
+    scheme, _, token = header.partition(' ')
+    token = token.strip()
+    if scheme.lower() != 'bearer' or not token or len(token) > MAX_TOKEN_LENGTH:
+        return None
+    if token.count('.') != 2 or ' ' in token:
+        return None
+    return token
+
+
 class JWTAuth:
 
     async def authenticate(self, conn):
         guest = AuthCredentials(['unauthenticated']), UnauthenticatedUser()
 
-        if 'authorization' not in conn.headers:
-            return guest
-
-        token = conn.headers.get('authorization').split(' ')[1]  # Bearer token_hash
-        if not token:
+        token = bearer_token(conn.headers.get('authorization'))
+        if token is None:
             return guest
 
-        user = get_current_user(token=token)
+        user = await get_current_user(token=token)
 
         if not user:
             return guest
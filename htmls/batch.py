@@ -0,0 +1,45 @@
+import zipfile
+from functools import partial
+from fastapi.exceptions import HTTPException
+from core.config import get_settings
+
+settings = get_settings()
+
+HTML_EXTENSIONS = ('.html', '.htm')
+
+
+def open_batch(files):
+    # Возвращает список (имя, функция чтения). ZIP не распаковывается на диск:
+    # оглавление читается сразу, а каждая запись - только когда до неё дойдёт очередь
+    entries = []
+    for upload in files:
+        if zipfile.is_zipfile(upload.file):
+            archive = zipfile.ZipFile(upload.file)
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(HTML_EXTENSIONS):
+                    continue
+                # Размер из оглавления архива проверяем до распаковки
+                if info.file_size > settings.UPLOAD_MAX_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"{info.filename} is larger than {settings.UPLOAD_MAX_BYTES} bytes.",
+                    )
+                entries.append((info.filename, partial(archive.read, info)))
+        else:
+            entries.append((upload.filename, partial(_read_upload, upload)))
+
+    if not entries:
+        raise HTTPException(status_code=422, detail="No HTML documents found in the upload.")
+
+    if len(entries) > settings.BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch is limited to {settings.BATCH_MAX_FILES} documents.",
+        )
+
+    return entries
+
+
+def _read_upload(upload):
+    upload.file.seek(0)
+    return upload.file.read()
@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from core.config import get_settings
+from core.metrics import metrics
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+def content_digest(html_content):
+    # Строки приводим к UTF-8, чтобы файл и тот же текст из формы давали один хэш
+    if isinstance(html_content, str):
+        html_content = html_content.encode('utf-8')
+    return hashlib.sha256(html_content).hexdigest()
+
+
+def cache_key(digest, *parts):
+    # Ключ - хэш содержимого документа и всего, от чего зависит результат
+    # (версия набора критериев, парсер и т.п.)
+    key = hashlib.sha256(digest.encode('ascii'))
+    for part in parts:
+        key.update(b'\0' + str(part).encode('utf-8'))
+    return key.hexdigest()
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logger.error("Writing an analysis result to the cache failed", exc_info=future.exception())
+
+
+class ResultCache:
+    # Двухуровневый кэш результатов анализа: LRU в памяти, ограниченный
+    # суммарным размером, и необязательная SQLite-база, переживающая перезапуск.
+    # Вся работа с базой идёт в одном отдельном потоке, а не в event loop:
+    # запись не ждёт ответа, коммит делается пачкой. Записи старше ttl и самые
+    # старые записи сверх disk_max_bytes удаляются по created_at.
+
+    # Коммит после стольких записей или через столько секунд после предыдущего
+    commit_every = 64
+    commit_interval = 1.0
+    # Как часто (в записях) проверять срок хранения и размер базы
+    prune_every = 256
+
+    def __init__(self, max_bytes, path=None, disk_max_bytes=None, ttl=None):
+        self.max_bytes = max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._db = None
+        self._io = None
+        self._uncommitted = 0
+        self._committed_at = time.monotonic()
+        self._writes = 0
+
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value BLOB NOT NULL, created_at REAL NOT NULL)'
+            )
+            self._db.execute('CREATE INDEX IF NOT EXISTS results_created_at ON results (created_at)')
+            self._prune()
+            self._db.commit()
+            self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix='result-cache')
+
+    async def get(self, key):
+        # Возвращает (результат, уровень), где уровень - 'memory', 'disk' или None
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return json.loads(value), 'memory'
+
+        if self._db is not None:
+            value = await asyncio.get_running_loop().run_in_executor(self._io, self._read, key)
+            if value is not None:
+                self.hits += 1
+                self.disk_hits += 1
+                self._remember(key, value)
+                return json.loads(value), 'disk'
+
+        self.misses += 1
+        return None, None
+
+    def set(self, key, result):
+        value = json.dumps(result, ensure_ascii=False).encode('utf-8')
+        self._remember(key, value)
+
+        if self._db is not None:
+            self._io.submit(self._write, key, value, time.time()).add_done_callback(_log_failure)
+
+    def close(self):
+        if self._db is not None:
+            self._io.submit(self._db.commit)
+            self._io.shutdown(wait=True)
+            self._db.close()
+            self._db = None
+
+    def _read(self, key):
+        row = self._db.execute('SELECT value, created_at FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None or (self.ttl and row[1] < time.time() - self.ttl):
+            return None
+        return row[0]
+
+    def _write(self, key, value, created_at):
+        self._db.execute(
+            'INSERT OR REPLACE INTO results (key, value, created_at) VALUES (?, ?, ?)',
+            (key, value, created_at),
+        )
+        self._uncommitted += 1
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self._prune()
+        if self._uncommitted >= self.commit_every or time.monotonic() - self._committed_at >= self.commit_interval:
+            self._db.commit()
+            self._uncommitted = 0
+            self._committed_at = time.monotonic()
+
+    def _prune(self):
+        if self.ttl:
+            self._db.execute('DELETE FROM results WHERE created_at < ?', (time.time() - self.ttl,))
+        if not self.disk_max_bytes:
+            return
+
+        total = self._db.execute('SELECT COALESCE(SUM(LENGTH(value)), 0) FROM results').fetchone()[0]
+        if total <= self.disk_max_bytes:
+            return
+        # Удаляем самые старые записи, пока база не уложится в лимит
+        excess = total - self.disk_max_bytes
+        cutoff = None
+        for created_at, size in self._db.execute('SELECT created_at, LENGTH(value) FROM results ORDER BY created_at'):
+            excess -= size
+            cutoff = created_at
+            if excess <= 0:
+                break
+        self._db.execute('DELETE FROM results WHERE created_at <= ?', (cutoff,))
+
+    def _remember(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous)
+
+        self._entries[key] = value
+        self.size += len(value)
+
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'entries': len(self._entries),
+            'size': self.size,
+        }
+
+
+result_cache = ResultCache(
+    max_bytes=settings.ANALYSIS_CACHE_MAX_BYTES,
+    path=settings.ANALYSIS_CACHE_PATH or None,
+    disk_max_bytes=settings.ANALYSIS_CACHE_DISK_MAX_BYTES,
+    ttl=settings.ANALYSIS_CACHE_TTL_SECONDS,
+)
+metrics.collect('analysis_cache_requests_total', 'counter', 'Обращения к кэшу результатов анализа', lambda: [
+    ({'result': 'memory_hit'}, result_cache.hits - result_cache.disk_hits),
+    ({'result': 'disk_hit'}, result_cache.disk_hits),
+    ({'result': 'miss'}, result_cache.misses),
+])
+metrics.collect('analysis_cache_bytes', 'gauge', 'Размер кэша результатов в памяти', lambda: [({}, result_cache.size)])
@@ -0,0 +1,148 @@
+import re
+import time
+from bisect import bisect_right
+from bs4.element import PreformattedString
+from core.config import get_settings
+
+try:
+    # Движок без возвратов: время поиска линейно при любом входе
+    import re2
+except ImportError:
+    re2 = None
+
+settings = get_settings()
+
+# re2 не поддерживает просмотр вперёд/назад, а его \w и \b знают только ASCII,
+# поэтому через него идут лишь ASCII-шаблоны телефона и email. Все шаблоны
+# написаны без вложенных неограниченных повторов и линейны и в модуле re.
+_compile = re2.compile if re2 is not None else re.compile
+
+# Телефон: цифры с одиночными разделителями (пробел, скобки, точка, дефис), 7-15 цифр
+PHONE = _compile(r'(?:\+|\()?\b\d(?:[ ().-]{0,2}\d){6,14}\b')
+EMAIL = _compile(r'\b[A-Za-z0-9._%+-]{1,64}@(?:[A-Za-z0-9-]{1,63}\.){1,8}[A-Za-z]{2,24}\b')
+
+STREET = re.compile(
+    r'\b(?:street|st|avenue|ave|road|rd|highway|hwy|square|sq|trail|trl|drive|dr|court|ct|park|pk|lane|ln|'
+    r'boulevard|blvd|circle|cir|plaza|plz|alley|aly|way|wy|point|pt|parkway|pkwy|commune|cm|district|dist|'
+    r'province|prov|region|reg|territory|terr|city|cty|town|tn|village|vlg|municipality|mun|county|cnty|'
+    r'state|country|cntry|ул|пр|просп|пер|ш|шоссе|бульв|бульвар|наб|набережн|пл|площ|площадь)\b\.?',
+    re.IGNORECASE,
+)
+APARTMENT = re.compile(r'\b(?:кв|комн|комната|офис|к|квартира)\.?\s?\d{1,4}\b', re.IGNORECASE)
+HOUSE_NUMBER = re.compile(r'\b\d{1,4}\b')
+ADDRESS_TEXT = re.compile(r'[\w\s.,-]*')
+
+# Сколько символов адреса допускается до названия улицы и между улицей и квартирой
+ADDRESS_PREFIX_CHARS = 60
+ADDRESS_BODY_CHARS = 120
+
+# Длинный текст просматривается окнами, и между окнами проверяется бюджет времени.
+# Соседние окна перекрываются на длину самого длинного совпадения (email - до 601
+# символа), поэтому совпадение на стыке окон не теряется
+SCAN_WINDOW_CHARS = 64 * 1024
+SCAN_OVERLAP_CHARS = 1024
+
+SKIPPED_PARENTS = {'script', 'style', 'template', 'noscript'}
+
+
+def is_visible_text(node):
+    return not isinstance(node, PreformattedString) and node.parent is not None and node.parent.name not in SKIPPED_PARENTS
+
+
+def text_nodes(soup):
+    # Видимый текст документа по узлам, без повторной сериализации HTML
+    return [node for node in soup.find_all(string=True) if is_visible_text(node)]
+
+
+def scan(pattern, text, deadline=None):
+    # Те же совпадения, что и pattern.finditer(text), но поиск идёт окнами и
+    # прекращается, если к началу очередного окна срок deadline уже прошёл.
+    # pos/endpos вместо срезов: \b на границе окна видит соседние символы
+    position = 0
+    while position < len(text):
+        if deadline is not None and time.monotonic() > deadline:
+            return
+        window_end = position + SCAN_WINDOW_CHARS
+        for match in pattern.finditer(text, position, window_end + SCAN_OVERLAP_CHARS):
+            if match.start() >= window_end:
+                break
+            yield match
+            position = match.end()
+        position = max(position, window_end)
+
+
+def find_addresses(text, deadline=None):
+    # Адрес ищется от редких якорей: номер квартиры/офиса, перед ним в пределах
+    # окна - название улицы, перед ним - номер дома. Каждый кусок проверяется
+    # простыми шаблонами на коротком срезе, поэтому общий проход линеен.
+    addresses = []
+    streets = list(scan(STREET, text, deadline))
+    street_ends = [street.end() for street in streets]
+    last_end = 0
+
+    for apartment in scan(APARTMENT, text, deadline):
+        # Ближайшее название улицы, закончившееся до номера квартиры
+        position = bisect_right(street_ends, apartment.start()) - 1
+        if position < 0:
+            continue
+        street = streets[position]
+        if (
+            street.start() < last_end
+            or apartment.start() - street.end() > ADDRESS_BODY_CHARS
+            or not ADDRESS_TEXT.fullmatch(text, street.end(), apartment.start())
+        ):
+            continue
+
+        window_start = max(last_end, street.start() - ADDRESS_PREFIX_CHARS)
+        house = HOUSE_NUMBER.search(text, window_start, street.start())
+        while house is not None and not ADDRESS_TEXT.fullmatch(text, house.end(), street.start()):
+            house = HOUSE_NUMBER.search(text, house.end(), street.start())
+        if house is None:
+            continue
+
+        addresses.append(text[house.start():apartment.end()].strip())
+        last_end = apartment.end()
+
+    return addresses
+
+
+class ContactExtractor:
+    # Поиск телефонов, email и адресов в тексте документа с ограничением по времени.
+    # Бюджет проверяется между текстовыми узлами и между окнами внутри длинного
+    # узла: по его истечении возвращается то, что найдено к этому моменту,
+    # и признак того, что поиск прошёл не весь текст.
+
+    def __init__(self, budget):
+        self.budget = budget
+
+    def find(self, texts, budget=None):
+        # ({метка: [(значение, текстовый узел), ...]}, прерван ли поиск) - узел нужен,
+        # чтобы исправление могло сразу работать с местом находки, не ища его в дереве заново
+        budget = self.budget if budget is None else budget
+        deadline = time.monotonic() + budget
+        contacts = {'phone': [], 'email': [], 'address': []}
+
+        for node in texts:
+            if time.monotonic() > deadline:
+                return contacts, True
+            # Узел документа - подкласс str, но поиску нужен обычный текст
+            text = str(node)
+
+            for label, pattern in (('phone', PHONE), ('email', EMAIL)):
+                contacts[label].extend((match.group(0), node) for match in scan(pattern, text, deadline))
+                if time.monotonic() > deadline:
+                    return contacts, True
+
+            contacts['address'].extend((address, node) for address in find_addresses(text, deadline))
+
+        # Срок мог истечь посреди поиска адресов в последнем узле
+        return contacts, time.monotonic() > deadline
+
+    def extract(self, source, budget=None):
+        # Только найденные значения - для строки или текстовых узлов документа
+        texts = [source] if isinstance(source, str) else text_nodes(source)
+        contacts, _ = self.find(texts, budget)
+        return {label: [value for value, _ in matches] for label, matches in contacts.items()}
+
+
+contact_extractor = ContactExtractor(budget=settings.CONTACT_EXTRACTION_BUDGET_SECONDS)
@@ -0,0 +1,298 @@
+import inspect
+import time
+from htmls.document import Issue
+
+
+class Criterion:
+    # Описание критерия: проверка и её метаданные. Сигнатура проверки
+    # разбирается один раз при создании, а не для каждого документа.
+    # tags - имена тегов, которые нужны проверке (None - нужны все);
+    # counted - теги, число которых служит признаком критерия при обучении.
+
+    def __init__(self, check, weight=1, version=1, tags=None, counted=(), id=None):
+        self.id = id or check.__name__
+        self.check = check
+        self.weight = weight
+        self.version = version
+        self.tags = frozenset(tags) if tags is not None else None
+        self.counted = tuple(counted)
+        self.takes_file_path = 'file_path' in inspect.signature(check).parameters
+
+    def __call__(self, index, file_path=None):
+        if self.takes_file_path:
+            return self.check(index, file_path)
+        return self.check(index)
+
+    def count(self, index):
+        return sum(len(index.find_all(name)) for name in self.counted)
+
+    def __repr__(self):
+        return f'Criterion({self.id!r}, weight={self.weight}, version={self.version})'
+
+
+def check_figure(index):
+    figures = index.find_all('figure')
+    correct_figures = 0
+    errors = []
+
+    for i, figure in enumerate(figures):
+        if not index.has_descendant(figure, 'figcaption'):
+            error_msg = f'Отсутствует тег <figcaption> внутри тега <figure>'
+            errors.append(Issue(error_msg, 'figure', [figure], index.locate))
+        else:
+            correct_figures += 1
+
+    return correct_figures == len(figures), errors
+
+def check_summary_details(index):
+    summaries = index.find_all('summary')
+    errors = []
+
+    if not summaries:
+        error_msg = 'Постарайтесь использовать тэг <summary> для размещения краткого содержания или заголовка детализированного содержимого'
+        errors.append(error_msg)
+
+    return len(summaries) > 0, errors
+
+def check_blockquote(index):
+    blockquotes = index.find_all('blockquote')
+    errors = []
+
+    if not blockquotes:
+        error_msg = 'Постарайтесь использовать тэг <blockquote> для цитирования длинных фрагментов текста из внешних источников'
+        errors.append(error_msg)
+
+    return len(blockquotes) > 0, errors
+
+def check_cite(index):
+    cites = index.find_all('cite')
+    errors = []
+
+    if not cites:
+        error_msg = 'Постарайтесь использовать тэг <cite> для указания названия произведения или источника цитаты'
+        errors.append(error_msg)
+
+    return len(cites) > 0, errors
+
+def check_time(index):
+    times = index.find_all('time')
+    errors = []
+
+    if not times:
+        error_msg = 'Постарайтесь использовать тэг <time> для указания даты и/или времени'
+        errors.append(error_msg)
+
+    return len(times) > 0, errors
+
+def check_address(index):
+    addresses = index.find_all('address')
+    errors = []
+
+    if not addresses:
+        error_msg = 'Постарайтесь использовать тэг <address> для указания контактной информации автора или владельца сайта'
+        errors.append(error_msg)
+
+    return len(addresses) > 0, errors
+
+def check_abbr(index):
+    abbrs = index.find_all('abbr')
+    correct_abbrs = 0
+    errors = []
+
+    for i, abbr in enumerate(abbrs):
+        if 'title' not in abbr.attrs:
+            error_msg = f'Отсутствует атрибут title в теге <abbr>'
+            errors.append(Issue(error_msg, 'abbr', [abbr], index.locate))
+        else:
+            correct_abbrs += 1
+
+    return correct_abbrs == len(abbrs), errors
+
+def check_q(index):
+    qs = index.find_all('q')
+    errors = []
+
+    if not qs:
+        error_msg = 'Постарайтесь использовать тэг <q> для коротких цитат с автоматическим добавлением кавычек'
+        errors.append(error_msg)
+
+    return len(qs) > 0, errors
+
+def check_mark(index):
+    marks = index.find_all('mark')
+    errors = []
+
+    if not marks:
+        error_msg = 'Постарайтесь использовать тэг <mark> для выделения важной информации'
+        errors.append(error_msg)
+
+    return len(marks) > 0, errors
+
+def check_del_ins(index):
+    del_ins = index.find_all('del', 'ins')
+    errors = []
+
+    if not del_ins:
+        error_msg = 'Постарайтесь использовать тэги <del> для удаленного текста и <ins> для вставленного текста'
+        errors.append(error_msg)
+
+    return len(del_ins) > 0, errors
+
+
+
+
+def check_table(index):
+    tables = index.find_all('table')
+    errors = []
+
+    for i, table in enumerate(tables):
+        if not index.has_descendant(table, 'tr') or not index.has_descendant(table, 'th', 'td'):
+            error_msg = f'Неправильное использование тега <table>'
+            errors.append(Issue(error_msg, 'table', [table], index.locate))
+
+    return len(errors) == 0, errors
+
+
+def check_logical_blocks(index):
+    header = index.find('header')
+    main = index.find('main')
+    footer = index.find('footer')
+    errors = []
+
+    if not header:
+        error_msg = 'Необходимо использовать тег <header> для обозначения шапки страницы'
+        errors.append(error_msg)
+
+    if not main:
+        error_msg = 'Необходимо использовать тег <main> для обозначения основного контента страницы'
+        errors.append(error_msg)
+
+    if not footer:
+        error_msg = 'Необходимо использовать тег <footer> для обозначения подвала страницы'
+        errors.append(error_msg)
+
+    return len(errors) == 0, errors
+
+def check_semantic_blocks(index):
+    semantic_tags = {'nav', 'aside', 'article', 'section'}
+    errors = []
+
+    for tag in semantic_tags:
+        if not index.find(tag):
+            error_msg = f'Постарайтесь использовать тег <{tag}> для разделения смысловых блоков на странице'
+            errors.append(error_msg)
+
+    return len(errors) == 0, errors
+
+def check_headings(index):
+    # Только h1-h6: html, head, header и т.п. заголовками не считаются, иначе
+    # критерий зависел бы от того, достраивает ли парсер <html> у фрагмента
+    headings = index.find_all('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+    errors = []
+
+    if not headings:
+        error_msg = 'Постарайтесь использовать тэг <h> для обозначения заголовков'
+        errors.append(error_msg)
+
+    return len(errors) == 0, errors
+
+
+def check_nav_tag(index):
+    nav_tags = index.find_all('nav')
+    # div с id="nav" и class="nav" одновременно находится в обоих словарях - учитываем его один раз
+    candidates = {id(tag): tag for tag in index.ids.get('nav', []) + index.classes.get('nav', []) if tag.name == 'div'}
+    div_navs = sorted(candidates.values(), key=index.ordinal)
+
+    if len(nav_tags) > 0 and len(div_navs) == 0:
+        return True, []
+
+    errors = []
+    if len(div_navs) > 0:
+        error_msg = 'Нужно использовать nav вместо div с id/class=nav'
+        errors.append(Issue(error_msg, 'div', div_navs, index.locate))
+
+    return False, errors
+
+
+# Общий реестр критериев: порядок задаёт порядок колонок в разметке датасета.
+# При изменении проверки увеличивайте её version - от версий зависят ключ кэша
+# результатов API и повторная разметка датасета.
+CRITERIA = [
+    Criterion(check_table, tags=('table', 'tr', 'th', 'td'), counted=('table',)),
+    Criterion(check_logical_blocks, tags=('header', 'main', 'footer'), counted=('header', 'main', 'footer')),
+    Criterion(check_semantic_blocks, tags=('nav', 'aside', 'article', 'section'), counted=('nav', 'aside', 'article', 'section')),
+    # Версия 2: заголовками считаются только h1-h6 (раньше - любые теги на h, включая header);
+    # оценки и колонка датасета изменились, кэш и индекс разметки пересчитываются
+    Criterion(check_headings, version=2, tags=('h1', 'h2', 'h3', 'h4', 'h5', 'h6'), counted=('h1', 'h2', 'h3', 'h4', 'h5', 'h6')),
+    Criterion(check_nav_tag, version=2, tags=('nav', 'div'), counted=('nav',)),
+    Criterion(check_figure, tags=('figure', 'figcaption'), counted=('figure',)),
+    Criterion(check_summary_details, tags=('summary',), counted=('summary',)),
+    Criterion(check_blockquote, tags=('blockquote',), counted=('blockquote',)),
+    Criterion(check_cite, tags=('cite',), counted=('cite',)),
+    Criterion(check_time, tags=('time',), counted=('time',)),
+    Criterion(check_address, tags=('address',), counted=('address',)),
+    Criterion(check_abbr, tags=('abbr',), counted=('abbr',)),
+    Criterion(check_q, tags=('q',), counted=('q',)),
+    Criterion(check_mark, tags=('mark',), counted=('mark',)),
+    Criterion(check_del_ins, tags=('del', 'ins'), counted=('del', 'ins')),
+]
+
+CRITERIA_BY_ID = {criterion.id: criterion for criterion in CRITERIA}
+
+# Порядок для ранней остановки: сначала самые весомые критерии
+CRITERIA_BY_SEVERITY = sorted(CRITERIA, key=lambda criterion: -criterion.weight)
+
+# Строка, меняющаяся при изменении набора, версий или весов критериев
+CRITERIA_SIGNATURE = ';'.join(f'{c.id}:{c.version}:{c.weight}' for c in CRITERIA)
+
+
+def required_tags(criteria=CRITERIA):
+    # Объединение тегов, нужных критериям, или None, если кому-то нужны все
+    tags = set()
+    for criterion in criteria:
+        if criterion.tags is None:
+            return None
+        tags |= criterion.tags
+    return frozenset(tags)
+
+
+def run_criteria(index, criteria=CRITERIA, file_path=None, timings=None):
+    # (критерий, прошёл ли, ошибки) для каждого критерия;
+    # с timings время каждой проверки записывается как criterion.<id>
+    for criterion in criteria:
+        if timings is None:
+            is_correct, errors = criterion(index, file_path)
+        else:
+            started = time.perf_counter()
+            is_correct, errors = criterion(index, file_path)
+            timings.add(f'criterion.{criterion.id}', time.perf_counter() - started)
+        yield criterion, is_correct, errors
+
+
+def weighted_score(passed):
+    # passed - пары (критерий, прошёл ли); доля веса прошедших критериев
+    total = sum(criterion.weight for criterion, _ in passed)
+    return sum(criterion.weight for criterion, is_correct in passed if is_correct) / total if total else 0
+
+
+def decide_threshold(index, threshold, criteria=CRITERIA_BY_SEVERITY, timings=None):
+    # Достигает ли взвешенная оценка порога. Критерии проверяются по порядку
+    # (по умолчанию - по убыванию веса), и проверка прекращается, как только
+    # оставшиеся критерии уже не могут изменить исход.
+    # -> (прошёл ли, нижняя и верхняя граница оценки, число проверенных критериев)
+    total = sum(criterion.weight for criterion in criteria)
+    if not total:
+        return threshold <= 0, 0, 0, 0
+
+    passed = 0
+    remaining = total
+    evaluated = 0
+    results = run_criteria(index, criteria, timings=timings)
+    while passed / total < threshold <= (passed + remaining) / total:
+        criterion, is_correct, _ = next(results)
+        evaluated += 1
+        remaining -= criterion.weight
+        if is_correct:
+            passed += criterion.weight
+
+    return passed / total >= threshold, passed / total, (passed + remaining) / total, evaluated
@@ -0,0 +1,202 @@
+import codecs
+import re
+from bisect import bisect_right
+from functools import cached_property
+import chardet
+
+BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+# Сколько байт из начала файла смотрим в поисках <meta charset> и отдаём chardet
+META_SAMPLE_BYTES = 4 * 1024
+DETECT_SAMPLE_BYTES = 64 * 1024
+
+META_CHARSET = re.compile(
+    rb'<meta[^>]+charset\s*=\s*["\']?\s*([a-z0-9_:.\-]+)',
+    re.IGNORECASE,
+)
+
+# Разметка, внутри которой "<name" не является тегом: комментарии, CDATA, doctype,
+# закрывающие теги и значения атрибутов открывающих тегов.
+# Группа 1 - имя закрывающего тега, группа 2 - открывающего
+MARKUP_TOKEN = re.compile(
+    r'<!--.*?(?:-->|\Z)'
+    r'|<!\[CDATA\[.*?(?:\]\]>|\Z)'
+    r'|<[!?][^>]*>?'
+    r'|</([a-zA-Z][^\s/>]*)[^>]*>?'
+    r'|</[^>]*>?'
+    r'|<([a-zA-Z][^\s/>]*)(?:[^>"\']|"[^"]*"|\'[^\']*\')*>?',
+    re.DOTALL,
+)
+LINE_BREAK = re.compile(r'\r\n|\r|\n')
+# Элементы, содержимое которых парсер читает как текст до закрывающего тега
+RAW_TEXT_TAGS = frozenset(('script', 'style', 'textarea', 'title', 'xmp', 'iframe', 'noembed', 'noframes'))
+# Элементы без закрывающего тега
+VOID_TAGS = frozenset((
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr',
+))
+
+
+def bom_encoding(data):
+    return next((name for bom, name in BOMS if data.startswith(bom)), None)
+
+
+def meta_encoding(data):
+    match = META_CHARSET.search(data[:META_SAMPLE_BYTES])
+    if match is None:
+        return None
+    try:
+        return codecs.lookup(match.group(1).decode('ascii')).name
+    except LookupError:
+        return None
+
+
+def detect_encoding(data):
+    # BOM и <meta charset> проверяются сразу, chardet запускается только на начале файла
+    encoding = bom_encoding(data) or meta_encoding(data)
+    if encoding is not None:
+        return encoding
+
+    encoding = chardet.detect(data[:DETECT_SAMPLE_BYTES]).get('encoding')
+    if encoding is None or encoding == 'ascii':
+        # В начале файла могли быть только ASCII-символы, а дальше UTF-8
+        return 'utf-8'
+    return encoding
+
+
+class Issue(str):
+    # Текст ошибки вместе с узлами документа, к которым она относится.
+    # Ведёт себя как обычная строка, поэтому годится везде, где ждут текст ошибки.
+    # Места в исходнике ищутся функцией locate (TagIndex.locate) только в locations():
+    # оценке без мест ошибок не нужно размечать исходный текст.
+
+    def __new__(cls, message, tag=None, nodes=(), locate=None):
+        issue = super().__new__(cls, message)
+        issue.tag = tag
+        issue.nodes = list(nodes)
+        issue.locate = locate
+        return issue
+
+    @property
+    def positions(self):
+        if self.locate is None:
+            return []
+        positions = (self.locate(node) for node in self.nodes)
+        return [position for position in positions if position is not None]
+
+    def locations(self):
+        return [
+            {'message': str(self), 'tag': self.tag, 'line': line, 'column': column}
+            for line, column in self.positions
+        ]
+
+
+def issue_locations(errors):
+    return [location for error in errors if isinstance(error, Issue) for location in error.locations()]
+
+
+class Document:
+    # Файл, прочитанный и декодированный один раз: байты, кодировка, текст
+    # и индекс начал строк для перевода смещения в строку и столбец.
+    # Текст декодируется при первом обращении.
+
+    def __init__(self, data, encoding=None, path=None):
+        self.path = path
+        self.data = data
+        self.encoding = encoding
+        self._tag_spans = None
+
+    @classmethod
+    def from_path(cls, path, encoding=None):
+        with open(path, 'rb') as f:
+            return cls(f.read(), encoding, path)
+
+    @cached_property
+    def source(self):
+        # Декодированный текст как есть - к нему относятся все смещения
+        if isinstance(self.data, str):
+            return self.data
+
+        self.encoding = self.encoding or detect_encoding(self.data)
+        try:
+            return self.data.decode(self.encoding)
+        except (UnicodeDecodeError, LookupError):
+            self.encoding = 'iso-8859-1'
+            return self.data.decode(self.encoding)
+
+    @cached_property
+    def text(self):
+        # Переводы строк приводим к \n, как при чтении файла в текстовом режиме
+        return self.source.replace('\r\n', '\n').replace('\r', '\n')
+
+    @cached_property
+    def line_starts(self):
+        return [0] + [match.end() for match in LINE_BREAK.finditer(self.source)]
+
+    def line_of(self, offset):
+        # Номер строки (с 1) для смещения в self.source
+        return bisect_right(self.line_starts, offset)
+
+    def position(self, offset):
+        # (строка, столбец), оба с 1
+        line = self.line_of(offset)
+        return line, offset - self.line_starts[line - 1] + 1
+
+    def tag_spans(self, name):
+        # Места всех элементов name в исходнике. Текст размечается один раз для всех
+        # имён, и "<name" внутри комментариев, script, style и значений атрибутов не считается
+        if self._tag_spans is None:
+            self._tag_spans = scan_tags(self.source)
+        return self._tag_spans.get(name.lower(), [])
+
+    def tag_span(self, name, ordinal, count):
+        # Место элемента name с порядковым номером ordinal (с 0).
+        # count - сколько таких тегов нашёл парсер; если в тексте их другое число
+        # (парсер добавил tbody или выбросил лишний body), номера не совпадают
+        # и вместо неверного места возвращается None
+        spans = self.tag_spans(name)
+        if len(spans) != count:
+            return None
+        return spans[ordinal]
+
+    def tag_position(self, name, ordinal, count):
+        # (строка, столбец) открывающего тега или None
+        span = self.tag_span(name, ordinal, count)
+        return self.position(span[0]) if span is not None else None
+
+
+def scan_tags(text):
+    # Имя тега в нижнем регистре -> места его элементов по порядку:
+    # [начало открывающего тега, его конец, начало закрывающего, его конец].
+    # Закрывающий тег относится к последнему незакрытому элементу с тем же именем,
+    # как у парсера; если его нет, последние два значения - None
+    spans = {}
+    unclosed = {}
+    position = 0
+    while True:
+        match = MARKUP_TOKEN.search(text, position)
+        if match is None:
+            return spans
+        position = match.end()
+        closing, name = match.group(1, 2)
+        if closing is not None:
+            opened = unclosed.get(closing.lower())
+            if opened:
+                opened.pop()[2:] = match.span()
+            continue
+        if name is None:
+            continue
+
+        name = name.lower()
+        span = [match.start(), match.end(), None, None]
+        spans.setdefault(name, []).append(span)
+        unclosed.setdefault(name, []).append(span)
+        if name in RAW_TEXT_TAGS:
+            # Содержимое script, style и т.п. - текст до закрывающего тега
+            end = re.compile(rf'</{re.escape(name)}(?=[\s/>])', re.IGNORECASE).search(text, position)
+            position = end.start() if end is not None else len(text)
@@ -0,0 +1,114 @@
+from collections import defaultdict
+from bs4 import Tag
+
+
+class TagIndex:
+    # Индекс документа, собранный за один обход дерева:
+    # имя тега -> узлы, id -> узлы, class -> узлы, а также имена тегов,
+    # вложенных в каждый узел (нужно для проверок вида figure > figcaption).
+    # document передаётся, если парсер не сообщает позиции тегов: тогда
+    # место в исходнике ищется по порядковому номеру тега в тексте документа.
+    # wanted - имена тегов, нужные критериям; остальные теги не индексируются.
+
+    def __init__(self, document=None, wanted=None):
+        self.document = document
+        self.wanted = wanted
+        self.tags = defaultdict(list)
+        self.ids = defaultdict(list)
+        self.classes = defaultdict(list)
+        self._nested = {}
+        self._ordinals = {}
+        self._open = []
+
+    def visit(self, node, name, attrs, depth):
+        self._close(depth)
+
+        if self.wanted is not None and name not in self.wanted:
+            return
+
+        # Имя записывается только ближайшему открытому предку; остальным оно
+        # достанется при закрытии, поэтому глубокая вложенность не даёт O(n·глубина)
+        if self._open:
+            self._open[-1][1].add(name)
+
+        self._ordinals[id(node)] = len(self.tags[name])
+        self.tags[name].append(node)
+
+        node_id = attrs.get('id')
+        if node_id is not None:
+            self.ids[node_id].append(node)
+
+        classes = attrs.get('class')
+        if classes:
+            if isinstance(classes, str):
+                classes = classes.split()
+            for class_name in classes:
+                self.classes[class_name].append(node)
+
+        nested = set()
+        self._nested[id(node)] = nested
+        self._open.append((depth, nested))
+
+    def _close(self, depth):
+        # Закрываем узлы, из поддерева которых обход уже вышел: вложенное в узел
+        # вложено и в его родителя
+        while self._open and self._open[-1][0] >= depth:
+            _, nested = self._open.pop()
+            if self._open:
+                self._open[-1][1].update(nested)
+
+    def finish(self):
+        # Вызывается после обхода: закрывает узлы, открытые до конца документа
+        self._close(0)
+        return self
+
+    @property
+    def names(self):
+        return self.tags.keys()
+
+    def find_all(self, *names):
+        if len(names) == 1:
+            return self.tags.get(names[0], [])
+        return [node for name in names for node in self.tags.get(name, [])]
+
+    def find(self, name):
+        nodes = self.tags.get(name)
+        return nodes[0] if nodes else None
+
+    def has_descendant(self, node, *names):
+        nested = self._nested.get(id(node), ())
+        return any(name in nested for name in names)
+
+    def ordinal(self, node):
+        # Порядковый номер узла среди тегов с тем же именем, то есть в порядке документа
+        return self._ordinals[id(node)]
+
+    def locate(self, node):
+        # (строка, столбец) открывающего тега в исходном документе или None
+        if self.document is not None:
+            return self.document.tag_position(node.name, self._ordinals[id(node)], len(self.tags[node.name]))
+        return source_position(node)
+
+
+def source_position(node):
+    line = getattr(node, 'sourceline', None)
+    if line is None:
+        return None
+    return line, node.sourcepos + 1
+
+
+def walk_soup(soup, visitor):
+    # Обход в прямом порядке без рекурсии: каждый узел посещается ровно один раз
+    stack = [(child, 1) for child in reversed(soup.contents)]
+    while stack:
+        node, depth = stack.pop()
+        if not isinstance(node, Tag):
+            continue
+        visitor.visit(node, node.name, node.attrs, depth)
+        stack.extend((child, depth + 1) for child in reversed(node.contents))
+
+
+def build_index(soup, document=None, wanted=None):
+    index = TagIndex(document, wanted)
+    walk_soup(soup, index)
+    return index.finish()
@@ -0,0 +1,43 @@
+from collections import namedtuple
+from itertools import islice
+from pathlib import Path
+import numpy as np
+from htmls.criteria import CRITERIA
+from htmls.parsers import parse_index
+
+BatchScores = namedtuple('BatchScores', ['passed', 'scores', 'counts', 'columns'])
+
+
+def score_batch(documents, size=None, dtype=np.uint8, counts=False, engine=None, parser=None, criteria=CRITERIA):
+    # Оценка пачки документов для обучения: матрица (документы x критерии) из 0/1,
+    # взвешенные оценки и, по желанию, число тегов каждого критерия.
+    # Массивы выделяются заранее, поэтому построчных Python-объектов не копится.
+    # documents - HTML (str/bytes) или пути; для генератора нужно передать size.
+    if size is None:
+        size = len(documents)
+
+    passed = np.zeros((size, len(criteria)), dtype=dtype)
+    tag_counts = np.zeros((size, len(criteria)), dtype=np.uint32) if counts else None
+
+    rows = 0
+    for row, document in enumerate(islice(documents, size)):
+        if isinstance(document, Path):
+            document = document.read_bytes()
+        index = parse_index(document, engine, parser)
+
+        for column, criterion in enumerate(criteria):
+            is_correct, _ = criterion(index)
+            passed[row, column] = is_correct
+            if counts:
+                tag_counts[row, column] = criterion.count(index)
+        rows = row + 1
+
+    # Генератор мог закончиться раньше size
+    if rows < size:
+        passed = passed[:rows]
+        tag_counts = tag_counts[:rows] if counts else None
+
+    weights = np.array([criterion.weight for criterion in criteria], dtype=np.float32)
+    scores = passed.astype(np.float32, copy=False) @ weights / weights.sum()
+
+    return BatchScores(passed, scores, tag_counts, [criterion.id for criterion in criteria])
@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from fastapi.exceptions import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from core.config import get_settings
+from htmls.document import DETECT_SAMPLE_BYTES, detect_encoding
+
+settings = get_settings()
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _too_large(limit):
+    return HTTPException(status_code=413, detail=f"Upload is larger than {limit} bytes.")
+
+
+class UploadSizeLimitMiddleware:
+    # Ограничивает размер тела запроса для загрузок ещё до разбора multipart:
+    # сначала по Content-Length, затем по фактически полученным байтам
+
+    def __init__(self, app, limits):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope['path']) if scope['type'] == 'http' else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = Headers(scope=scope).get('content-length')
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            response = JSONResponse(content={"detail": _too_large(limit).detail}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > limit:
+                    raise _too_large(limit)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+class UploadedDocument:
+    # Загруженный документ: небольшие тела лежат в памяти, большие - во временном файле.
+    # В воркер передаются байты или путь к файлу, без лишних копий в памяти API.
+
+    def __init__(self, content, path, size, digest, encoding):
+        self.content = content
+        self.path = path
+        self.size = size
+        self.digest = digest
+        self.encoding = encoding
+
+    @property
+    def source(self):
+        return Path(self.path) if self.path else self.content
+
+    def cleanup(self):
+        if self.path:
+            os.unlink(self.path)
+            self.path = None
+
+
+async def read_upload(file, max_bytes=None):
+    max_bytes = max_bytes or settings.UPLOAD_MAX_BYTES
+    digest = hashlib.sha256()
+    # Для определения кодировки хватает начала файла - как и при разметке датасета
+    sample = bytearray()
+    buffer = bytearray()
+    spool = None
+    size = 0
+
+    try:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+
+            size += len(chunk)
+            if size > max_bytes:
+                raise _too_large(max_bytes)
+
+            digest.update(chunk)
+
+            if len(sample) < DETECT_SAMPLE_BYTES:
+                sample += chunk[:DETECT_SAMPLE_BYTES - len(sample)]
+
+            if spool is None and len(buffer) + len(chunk) > settings.UPLOAD_SPOOL_BYTES:
+                spool = tempfile.NamedTemporaryFile(prefix='upload-', suffix='.html', delete=False)
+                spool.write(buffer)
+                buffer = None
+            if spool is None:
+                buffer += chunk
+            else:
+                spool.write(chunk)
+
+        # chardet на 64 КиБ работает сотни миллисекунд - не в event loop
+        encoding = await asyncio.get_running_loop().run_in_executor(None, detect_encoding, bytes(sample))
+    except BaseException:
+        if spool is not None:
+            spool.close()
+            os.unlink(spool.name)
+        raise
+
+    if spool is not None:
+        spool.close()
+        return UploadedDocument(None, spool.name, size, digest.hexdigest(), encoding)
+
+    return UploadedDocument(bytes(buffer), None, size, digest.hexdigest(), encoding)
@@ -1,313 +1,325 @@
 import os
-from bs4 import BeautifulSoup
-import chardet
-import re
+import argparse
 import csv
-from functools import reduce
-import inspect
-import types
-
-def check_figure(soup):
-    figures = soup.find_all('figure')
-    correct_figures = 0
-    errors = []
-
-    for i, figure in enumerate(figures):
-        if not figure.find('figcaption'):
-            error_msg = f'Отсутствует тег <figcaption> внутри тега <figure> (фигура {i + 1})'
-            errors.append(error_msg)
+import hashlib
+import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+from core.config import get_settings
+from htmls.criteria import CRITERIA, required_tags, run_criteria, weighted_score
+from htmls.document import Document, issue_locations
+from htmls.engine import build_index
+from htmls.mark_index import MarkIndex
+from htmls.parsers import make_soup, tracks_positions
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+settings = get_settings()
+
+# Версии критериев для повторной разметки с --index берутся из общего реестра
+CRITERION_VERSIONS = {criterion.id: criterion.version for criterion in CRITERIA}
+
+
+def find_html_files(directories):
+    # Пары (путь, метка): меткой служит имя каталога, например Phish или NotPhish
+    files = []
+    for directory in directories:
+        label = os.path.basename(os.path.normpath(directory))
+        for root, _, names in os.walk(directory):
+            for name in names:
+                if name.endswith('.html'):
+                    files.append((os.path.join(root, name), label))
+    return files
+
+
+def mark_file(file_path, label=None, index=None):
+    # Возвращает запись разметки и обновление для индекса (или None, если обновлять нечего).
+    # Без индекса или для нового/изменённого файла считаются все критерии;
+    # для известного содержимого - только критерии, чья версия изменилась.
+    stat = os.stat(file_path)
+    digest = index.fingerprint(file_path, stat.st_size, stat.st_mtime_ns) if index else None
+    document = None
+    if digest is None:
+        document = Document.from_path(file_path)
+        digest = hashlib.sha256(document.data).hexdigest()
+
+    results = index.results(digest, CRITERION_VERSIONS, settings.HTML_PARSER) if index else {}
+    stale = [criterion for criterion in CRITERIA if criterion.id not in results]
+
+    computed = {}
+    if stale:
+        # Файл читается и декодируется один раз, критерии получают готовый документ
+        document = document or Document.from_path(file_path)
+        soup = make_soup(document.text)
+        tag_index = build_index(soup, None if tracks_positions(soup) else document, required_tags())
+        for criterion, is_correct, errors in run_criteria(tag_index, stale, file_path):
+            computed[criterion.id] = (is_correct, [str(error) for error in errors], issue_locations(errors))
+        results.update(computed)
+
+    scores = [1 if results[criterion.id][0] else 0 for criterion in CRITERIA]
+    score = weighted_score([(criterion, results[criterion.id][0]) for criterion in CRITERIA])
+    record = {'file_path': file_path, 'label': label, 'score': round(score, 2)}
+    record.update(zip(CRITERIA_COLUMNS, scores))
+    record['errors'] = [error for name in CRITERIA_COLUMNS for error in results[name][1]]
+    record['locations'] = [location for name in CRITERIA_COLUMNS for location in results[name][2]]
+
+    update = None
+    if document is not None:
+        update = (stat.st_size, stat.st_mtime_ns, digest, computed)
+    return record, update
+
+
+# Соединения с индексом внутри процессов пула: по одному на процесс
+_indexes = {}
+
+
+def _open_index(index_path):
+    if index_path not in _indexes:
+        _indexes[index_path] = MarkIndex(index_path)
+    return _indexes[index_path]
+
+
+def _safe_mark_file(item):
+    file_path, label, index_path = item
+    try:
+        index = _open_index(index_path) if index_path else None
+        record, update = mark_file(file_path, label, index)
+        return file_path, record, update, None
+    except Exception as e:
+        return file_path, None, None, repr(e)
+
+
+def _imap(executor, func, items, window, ordered):
+    # Как Executor.map, но в работе одновременно не больше window задач,
+    # и результаты можно получать в порядке готовности
+    items = iter(items)
+    pending = deque(executor.submit(func, item) for item in islice(items, window))
+
+    while pending:
+        if ordered:
+            future = pending.popleft()
+            future.result()
         else:
-            correct_figures += 1
-
-    return correct_figures == len(figures), errors
-
-def check_summary_details(soup):
-    summaries = soup.find_all('summary')
-    errors = []
-
-    if not summaries:
-        error_msg = 'Постарайтесь использовать тэг <summary> для размещения краткого содержания или заголовка детализированного содержимого'
-        errors.append(error_msg)
-
-    return len(summaries) > 0, errors
-
-def check_blockquote(soup):
-    blockquotes = soup.find_all('blockquote')
-    errors = []
-
-    if not blockquotes:
-        error_msg = 'Постарайтесь использовать тэг <blockquote> для цитирования длинных фрагментов текста из внешних источников'
-        errors.append(error_msg)
-
-    return len(blockquotes) > 0, errors
-
-def check_cite(soup):
-    cites = soup.find_all('cite')
-    errors = []
-
-    if not cites:
-        error_msg = 'Постарайтесь использовать тэг <cite> для указания названия произведения или источника цитаты'
-        errors.append(error_msg)
-
-    return len(cites) > 0, errors
-
-def check_time(soup):
-    times = soup.find_all('time')
-    errors = []
-
-    if not times:
-        error_msg = 'Постарайтесь использовать тэг <time> для указания даты и/или времени'
-        errors.append(error_msg)
-
-    return len(times) > 0, errors
-
-def check_address(soup):
-    addresses = soup.find_all('address')
-    errors = []
-
-    if not addresses:
-        error_msg = 'Постарайтесь использовать тэг <address> для указания контактной информации автора или владельца сайта'
-        errors.append(error_msg)
-
-    return len(addresses) > 0, errors
-
-def check_abbr(soup):
-    abbrs = soup.find_all('abbr')
-    correct_abbrs = 0
-    errors = []
-
-    for i, abbr in enumerate(abbrs):
-        if 'title' not in abbr.attrs:
-            error_msg = f'Отсутствует атрибут title в теге <abbr> (сокращение {i + 1})'
-            errors.append(error_msg)
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            future = done.pop()
+            pending.remove(future)
+
+        for item in islice(items, 1):
+            pending.append(executor.submit(func, item))
+
+        yield future.result()
+
+
+CRITERIA_COLUMNS = [criterion.id for criterion in CRITERIA]
+COLUMNS = ['file_path', 'label', 'score'] + CRITERIA_COLUMNS + ['errors', 'locations']
+
+
+class CsvOutput:
+    # Построчная запись в CSV. Контрольная точка - длина файла после сброса на диск:
+    # при продолжении всё, что записано после неё, отрезается.
+    batch_size = 100
+
+    def __init__(self, path, checkpoint=None):
+        self.resumed = checkpoint is not None and os.path.exists(path)
+        if self.resumed:
+            with open(path, 'r+b') as f:
+                f.truncate(checkpoint)
+
+        self._file = open(path, 'a' if self.resumed else 'w', newline='', encoding='utf_8_sig')
+        self._writer = csv.writer(self._file)
+        if not self.resumed:
+            self._writer.writerow(COLUMNS)
+
+    def write(self, record):
+        row = [record[column] for column in COLUMNS]
+        row[-2] = ', '.join(record['errors'])
+        row[-1] = json.dumps(record['locations'], ensure_ascii=False)
+        self._writer.writerow(row)
+
+    def checkpoint(self):
+        self._file.flush()
+        return os.fstat(self._file.fileno()).st_size
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetOutput:
+    # Каталог из файлов part-NNNNN.parquet, по одной группе строк в каждом.
+    # Строки копятся пачкой, поэтому память не растёт с размером корпуса, а каждая
+    # записанная часть сразу читаема (pyarrow.dataset, pandas.read_parquet).
+    # Контрольная точка - число записанных частей.
+    batch_size = 10000
+
+    def __init__(self, path, checkpoint=None):
+        if pa is None:
+            raise RuntimeError('Для записи в Parquet нужен пакет pyarrow')
+
+        self.path = path
+        self.resumed = checkpoint is not None and os.path.isdir(path)
+        self.parts = checkpoint if self.resumed else 0
+        self.rows = []
+        self.schema = pa.schema(
+            [('file_path', pa.string()), ('label', pa.string()), ('score', pa.float64())]
+            + [(column, pa.int8()) for column in CRITERIA_COLUMNS]
+            + [
+                ('errors', pa.list_(pa.string())),
+                ('locations', pa.list_(pa.struct([
+                    ('message', pa.string()),
+                    ('tag', pa.string()),
+                    ('line', pa.int32()),
+                    ('column', pa.int32()),
+                ]))),
+            ]
+        )
+
+        os.makedirs(path, exist_ok=True)
+        # Части после контрольной точки (или от прошлого запуска) не засчитаны - удаляем
+        for name in os.listdir(path):
+            if name.startswith('part-') and self._part_number(name) >= self.parts:
+                os.remove(os.path.join(path, name))
+
+    @staticmethod
+    def _part_number(name):
+        number = name[len('part-'):].split('.', 1)[0]
+        return int(number) if number.isdigit() else 0
+
+    def write(self, record):
+        self.rows.append(record)
+
+    def checkpoint(self):
+        if self.rows:
+            part = os.path.join(self.path, f'part-{self.parts:05d}.parquet')
+            table = pa.Table.from_pylist(self.rows, schema=self.schema)
+            # Пишем во временный файл, чтобы недописанная часть не выглядела готовой
+            pq.write_table(table, part + '.tmp')
+            os.replace(part + '.tmp', part)
+            self.parts += 1
+            self.rows = []
+        return self.parts
+
+    def close(self):
+        pass
+
+
+OUTPUTS = {'csv': CsvOutput, 'parquet': ParquetOutput}
+
+
+def _read_manifest(manifest_file):
+    # Манифест: пути обработанных файлов, после каждой порции - строка
+    # "#checkpoint N" с состоянием выходного файла на этот момент.
+    # Хвост без такой строки не засчитывается.
+    done = set()
+    checkpoint = None
+    if not os.path.exists(manifest_file):
+        return done, checkpoint
+
+    batch = []
+    with open(manifest_file, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line.startswith('#checkpoint '):
+                done.update(batch)
+                batch = []
+                checkpoint = int(line[len('#checkpoint '):])
+            elif line:
+                batch.append(line)
+    return done, checkpoint
+
+
+def mark_files(directories, output_file, workers=1, ordered=True, resume=False, output_format='csv', index_path=None):
+    if isinstance(directories, str):
+        directories = [directories]
+
+    manifest_file = output_file + '.manifest'
+    done, checkpoint = _read_manifest(manifest_file) if resume else (set(), None)
+
+    output = OUTPUTS[output_format](output_file, checkpoint)
+    if not output.resumed:
+        done = set()
+
+    files = find_html_files(directories)
+    total_files = len(files)
+    processed_files = len(done)
+    todo = [(file_path, label, index_path) for file_path, label in files if file_path not in done]
+    # Пишет в индекс только главный процесс, воркеры его лишь читают
+    index = MarkIndex(index_path) if index_path else None
+
+    with open(manifest_file, 'a' if output.resumed else 'w', encoding='utf-8') as manifest:
+        batch = []
+
+        def flush_checkpoint():
+            position = output.checkpoint()
+            if index is not None:
+                index.commit()
+            manifest.write(''.join(f'{file_path}\n' for file_path in batch))
+            manifest.write(f'#checkpoint {position}\n')
+            manifest.flush()
+            batch.clear()
+
+        if workers > 1:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            results = _imap(executor, _safe_mark_file, todo, window=workers * 4, ordered=ordered)
         else:
-            correct_abbrs += 1
-
-    return correct_abbrs == len(abbrs), errors
-
-def check_q(soup):
-    qs = soup.find_all('q')
-    errors = []
-
-    if not qs:
-        error_msg = 'Постарайтесь использовать тэг <q> для коротких цитат с автоматическим добавлением кавычек'
-        errors.append(error_msg)
-
-    return len(qs) > 0, errors
-
-def check_mark(soup):
-    marks = soup.find_all('mark')
-    errors = []
-
-    if not marks:
-        error_msg = 'Постарайтесь использовать тэг <mark> для выделения важной информации'
-        errors.append(error_msg)
-
-    return len(marks) > 0, errors
-
-def check_del_ins(soup):
-    del_ins = soup.find_all(['del', 'ins'])
-    errors = []
-
-    if not del_ins:
-        error_msg = 'Постарайтесь использовать тэги <del> для удаленного текста и <ins> для вставленного текста'
-        errors.append(error_msg)
-
-    return len(del_ins) > 0, errors
-
-
-
-
-def check_table(soup, file_path):
-    tables = soup.find_all('table')
-    errors = []
-    encoding = get_encoding(file_path)
-
-    for i, table in enumerate(tables):
-        if not table.find('tr') or not (table.find('th') or table.find('td')):
-            pattern = re.compile(r'<table(?:\s|>)', re.IGNORECASE)
-            with open(file_path, 'r', encoding=encoding) as f:
-                lines = f.readlines()
-                line_number = None
-                for j, line in enumerate(lines):
-                    if pattern.search(line):
-                        line_number = j + 1
-                        break
-            if line_number is not None:
-                error_msg = f'Неправильное использование тега <table> (строка {line_number})'
-                errors.append(error_msg)
+            executor = None
+            results = map(_safe_mark_file, todo)
+
+        try:
+            for file_path, record, update, error in results:
+                processed_files += 1
+                if error is not None:
+                    # Файл не попадает в манифест и будет повторён при следующем --resume
+                    print(f'Failed {file_path}: {error}')
+                    continue
+
+                output.write(record)
+                if index is not None and update is not None:
+                    index.store(file_path, *update, CRITERION_VERSIONS, settings.HTML_PARSER)
+                batch.append(file_path)
+                if len(batch) >= output.batch_size:
+                    flush_checkpoint()
+
+                percentage = (processed_files / total_files) * 100
+                print(f'Processed {processed_files}/{total_files} files ({percentage:.2f}%)')
+
+            flush_checkpoint()
+        finally:
+            output.close()
+            if index is not None:
+                index.close()
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Разметка датасета HTML-страниц по критериям семантической вёрстки')
+    parser.add_argument('dataset', help='каталог архива с подкаталогами training/validation')
+    parser.add_argument('output', help='каталог для файлов разметки')
+    parser.add_argument('--subsets', nargs='+', default=['training', 'validation'])
+    parser.add_argument('--labels', nargs='+', default=['Phish', 'NotPhish'])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='число процессов (1 - без пула)')
+    parser.add_argument('--unordered', action='store_true', help='писать строки в порядке готовности')
+    parser.add_argument('--resume', action='store_true', help='продолжить прерванную разметку по манифесту')
+    parser.add_argument('--index', help='SQLite-индекс для повторной разметки только новых и изменённых файлов')
+    parser.add_argument('--format', choices=sorted(OUTPUTS), default='csv', help='формат результата (parquet требует pyarrow)')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output, exist_ok=True)
 
-    return len(errors) == 0, errors
-
-
-def check_logical_blocks(soup):
-    header = soup.find('header')
-    main = soup.find('main')
-    footer = soup.find('footer')
-    errors = []
-
-    if not header:
-        error_msg = 'Необходимо использовать тег <header> для обозначения шапки страницы'
-        errors.append(error_msg)
-
-    if not main:
-        error_msg = 'Необходимо использовать тег <main> для обозначения основного контента страницы'
-        errors.append(error_msg)
-
-    if not footer:
-        error_msg = 'Необходимо использовать тег <footer> для обозначения подвала страницы'
-        errors.append(error_msg)
-
-    return len(errors) == 0, errors
-
-def check_semantic_blocks(soup):
-    semantic_tags = {'nav', 'aside', 'article', 'section'}
-    errors = []
-
-    for tag in semantic_tags:
-        if not soup.find(tag):
-            error_msg = f'Постарайтесь использовать тег <{tag}> для разделения смысловых блоков на странице'
-            errors.append(error_msg)
-
-    return len(errors) == 0, errors
-
-def check_headings(soup):
-    headings = soup.find_all(lambda tag: tag.name.startswith('h'))
-    errors = []
-
-    if not headings:
-        error_msg = 'Постарайтесь использовать тэг <h> для обозначения заголовков'
-        errors.append(error_msg)
-
-    return len(errors) == 0, errors
-
-
-def check_nav_tag(soup, file_path):
-    encoding = get_encoding(file_path)
-    nav_tags = soup.find_all('nav')
-    div_navs = soup.find_all(lambda tag: tag.name == 'div' and ('id' in tag.attrs and tag['id'] == 'nav' or 'class' in tag.attrs and 'nav' in tag['class']))
-
-    if len(nav_tags) > 0 and len(div_navs) == 0:
-        return True, []
-
-    errors = []
-    with open(file_path, 'r', encoding=encoding) as f:
-        lines = f.readlines()
-        for i, div in enumerate(div_navs):
-            pattern = re.compile(r'<div(?:\s+(?:id|class)="nav"(?:\s+|>)|>)', re.IGNORECASE)
-            line_number = None
-            for j, line in enumerate(lines):
-                if pattern.search(line):
-                    line_number = j + 1
-                    break
-            if line_number is not None:
-                error_msg = f'Нужно использовать nav вместо div с id/class=nav (строка {line_number})'
-                errors.append(error_msg)
-
-    return False, errors
-
-
-
-def calculate_score(soup, file_path, criteria):
-    total_criteria = len(criteria)
-    correct_criteria = [0] * total_criteria
-    all_errors = []
-
-    for i, criterion in enumerate(criteria):
-        is_correct, errors = criterion(soup, file_path) if isinstance(criterion, types.FunctionType) and 'file_path' in inspect.signature(criterion).parameters else criterion(soup)
-        correct_criteria[i] = 1 if is_correct else 0
-        all_errors.extend(errors)
-
-    score = sum(correct_criteria) / total_criteria if total_criteria > 0 else 0
-    return correct_criteria, all_errors
-
-
-
-
-import chardet
-
-def get_encoding(file_path):
-    with open(file_path, 'rb') as f:
-        rawdata = f.read()
-    result = chardet.detect(rawdata)
-    encoding = result.get('encoding')
-
-    if encoding is None:
-        encoding = 'utf-8'
-
-    try:
-        text = rawdata.decode(encoding)
-    except UnicodeDecodeError:
-        encoding = 'iso-8859-1'
-        text = rawdata.decode(encoding)
-
-    return encoding
-
-
-
-
-def mark_files(directory, output_file):
-    criteria = [
-        check_table,
-        check_logical_blocks,
-        check_semantic_blocks,
-        check_headings,
-        check_nav_tag,
-        check_figure,
-        check_summary_details,
-        check_blockquote,
-        check_cite,
-        check_time,
-        check_address,
-        check_abbr,
-        check_q,
-        check_mark,
-        check_del_ins
-    ]
-
-    total_files = 0
-    processed_files = 0
-
-    for root, _, files in os.walk(directory):
-        for file in files:
-            if file.endswith('.html'):
-                total_files += 1
-
-    with open(output_file, 'w', newline='', encoding='utf_8_sig') as csvfile:
-        writer = csv.writer(csvfile)
-        header_row = ['file_path', 'score'] + [c.__name__ for c in criteria] + ['errors']
-        writer.writerow(header_row)
-
-        for root, _, files in os.walk(directory):
-            for file in files:
-                if file.endswith('.html'):
-                    file_path = os.path.join(root, file)
-                    encoding = get_encoding(file_path)
-                    with open(file_path, 'r', encoding=encoding) as html_file:
-                        soup = BeautifulSoup(html_file, 'html.parser')
-                        scores, errors = calculate_score(soup, file_path, criteria)
-                        score = sum(scores) / len(criteria)
-                        row = [file_path, round(score, 2)] + scores + [', '.join(errors)]
-                        writer.writerow(row)
-                        processed_files += 1
-                        percentage = (processed_files / total_files) * 100
-                        print(f'Processed {processed_files}/{total_files} files ({percentage:.2f}%)')
+    # Проходим по директориям training и validation
+    for subdir in args.subsets:
+        subdir_path = os.path.join(args.dataset, subdir)
+        output_file = os.path.join(args.output, f'{subdir}.{args.format}')
 
+        # Phish и NotPhish пишутся в один файл
+        label_paths = [os.path.join(subdir_path, label) for label in args.labels]
+        mark_files(label_paths, output_file, workers=args.workers, ordered=not args.unordered, resume=args.resume, output_format=args.format, index_path=args.index)
 
 
 if __name__ == '__main__':
-    html_directory = 'D:\\PycharmProjects\\backend\\htmls\\dataset\\archive'
-    output_files = {
-        'training': 'D:\\PycharmProjects\\backend\\htmls\\marked_dataset\\training.csv',
-        'validation': 'D:\\PycharmProjects\\backend\\htmls\\marked_dataset\\validation.csv'
-    }
-
-    # Проходим по директориям training и validation
-    for subdir in ['training', 'validation']:
-        subdir_path = os.path.join(html_directory, subdir)
-        output_file = output_files[subdir]
-
-        # Проходим по директориям Phish и NotPhish
-        for label in ['Phish', 'NotPhish']:
-            label_path = os.path.join(subdir_path, label)
-            mark_files(label_path, output_file)
+    main()
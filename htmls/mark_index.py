@@ -0,0 +1,70 @@
+import json
+import sqlite3
+
+
+class MarkIndex:
+    # SQLite-индекс разметки для повторных запусков mark_dataset.
+    # files: отпечаток файла (размер, mtime, хэш содержимого) по пути;
+    # results: результат каждого критерия по хэшу содержимого вместе с версией
+    # критерия и парсером, которым он получен. Переименованный или
+    # скопированный файл с тем же содержимым тоже берётся из индекса.
+
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, digest TEXT NOT NULL)'
+        )
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            'digest TEXT NOT NULL, criterion TEXT NOT NULL, version INTEGER NOT NULL, parser TEXT NOT NULL, '
+            'passed INTEGER NOT NULL, errors TEXT NOT NULL, locations TEXT NOT NULL, '
+            'PRIMARY KEY (digest, criterion))'
+        )
+        self._db.commit()
+
+    def fingerprint(self, file_path, size, mtime_ns):
+        # Хэш содержимого, если файл не менялся с прошлой разметки
+        row = self._db.execute(
+            'SELECT digest FROM files WHERE path = ? AND size = ? AND mtime_ns = ?',
+            (file_path, size, mtime_ns),
+        ).fetchone()
+        return row[0] if row else None
+
+    def results(self, digest, versions, parser):
+        # Результаты критериев, посчитанные текущей версией критерия тем же парсером
+        rows = self._db.execute(
+            'SELECT criterion, version, parser, passed, errors, locations FROM results WHERE digest = ?',
+            (digest,),
+        ).fetchall()
+        return {
+            criterion: (bool(passed), json.loads(errors), json.loads(locations))
+            for criterion, version, row_parser, passed, errors, locations in rows
+            if versions.get(criterion) == version and row_parser == parser
+        }
+
+    def store(self, file_path, size, mtime_ns, digest, results, versions, parser):
+        self._db.execute(
+            'INSERT OR REPLACE INTO files (path, size, mtime_ns, digest) VALUES (?, ?, ?, ?)',
+            (file_path, size, mtime_ns, digest),
+        )
+        self._db.executemany(
+            'INSERT OR REPLACE INTO results (digest, criterion, version, parser, passed, errors, locations) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [
+                (
+                    digest, criterion, versions[criterion], parser, int(passed),
+                    json.dumps(errors, ensure_ascii=False), json.dumps(locations, ensure_ascii=False),
+                )
+                for criterion, (passed, errors, locations) in results.items()
+            ],
+        )
+
+    def commit(self):
+        self._db.commit()
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
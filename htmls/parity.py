@@ -0,0 +1,67 @@
+import os
+import sys
+from htmls.parsers import LexborHTMLParser, parser_available
+from htmls.process_html import score_html
+
+# Проверка того, что разные движки разбора дают одинаковую оценку.
+# В корпусе есть и фрагменты (fragment_*.html), какие приходят в /uploadByRaw:
+# lxml, html5lib и selectolax достраивают у них <html>/<body>, а html.parser - нет,
+# и критерии не должны от этого зависеть.
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parity_corpus')
+
+BACKENDS = {
+    'html.parser': {'engine': 'soup', 'parser': 'html.parser'},
+    'lxml': {'engine': 'soup', 'parser': 'lxml'},
+    'html5lib': {'engine': 'soup', 'parser': 'html5lib'},
+    'selectolax': {'engine': 'selectolax'},
+}
+
+
+def available_backends(backends=BACKENDS):
+    # Движки, которые действительно установлены: без этого make_soup и parse_index
+    # подменили бы недостающий движок встроенным, и сравнение было бы с самим собой
+    available, missing = {}, []
+    for name, options in backends.items():
+        installed = LexborHTMLParser is not None if options['engine'] == 'selectolax' else parser_available(options['parser'])
+        if installed:
+            available[name] = options
+        else:
+            missing.append(name)
+    return available, missing
+
+
+def compare_backends(html_content, backends=BACKENDS):
+    results = {}
+    for name, options in backends.items():
+        result = score_html(html_content, **options)
+        results[name] = (result['score'], sorted(result['recommendations']))
+
+    reference = results['html.parser']
+    mismatches = {name: result for name, result in results.items() if result != reference}
+    return reference, mismatches
+
+
+def check_corpus(directory=CORPUS_DIR):
+    backends, missing = available_backends()
+    for name in missing:
+        print(f'{name}: SKIPPED (not installed)')
+
+    failed = 0
+    for file_name in sorted(os.listdir(directory)):
+        if not file_name.endswith('.html'):
+            continue
+        with open(os.path.join(directory, file_name), 'rb') as f:
+            html_content = f.read()
+
+        reference, mismatches = compare_backends(html_content, backends)
+        if mismatches:
+            failed += 1
+            print(f'{file_name}: {", ".join(mismatches)} differ from html.parser')
+        else:
+            print(f'{file_name}: OK (score {reference[0]:.2f})')
+
+    return failed
+
+
+if __name__ == '__main__':
+    sys.exit(1 if check_corpus(*sys.argv[1:]) else 0)
@@ -0,0 +1,100 @@
+import logging
+from bs4 import BeautifulSoup, FeatureNotFound
+from core.config import get_settings
+from htmls.criteria import required_tags
+from htmls.document import Document
+from htmls.engine import TagIndex, build_index
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+FALLBACK_PARSER = 'html.parser'
+
+# Отсутствующие движки, о подмене которых уже предупредили
+_warned = set()
+
+
+def _warn_fallback(missing, used):
+    if missing not in _warned:
+        _warned.add(missing)
+        logger.warning("%s is not installed, falling back to %s", missing, used)
+
+
+def parser_available(parser):
+    try:
+        BeautifulSoup('', parser)
+    except FeatureNotFound:
+        return False
+    return True
+
+
+def make_soup(markup, parser=None, encoding=None):
+    parser = parser or settings.HTML_PARSER
+    # Кодировка имеет смысл только для байтов: строка уже декодирована
+    from_encoding = encoding if isinstance(markup, bytes) else None
+    try:
+        return BeautifulSoup(markup, parser, from_encoding=from_encoding)
+    except FeatureNotFound:
+        # lxml / html5lib не установлены - используем встроенный парсер
+        _warn_fallback(parser, FALLBACK_PARSER)
+        return BeautifulSoup(markup, FALLBACK_PARSER, from_encoding=from_encoding)
+
+
+def tracks_positions(soup):
+    # Точные sourceline/sourcepos даёт только встроенный парсер:
+    # lxml их не заполняет, а html5lib указывает на конец открывающего тега
+    return soup.builder.NAME == FALLBACK_PARSER
+
+
+def index_soup(soup, markup):
+    # Индекс с позициями тегов: от парсера или, если их нет, по тексту документа
+    document = None if tracks_positions(soup) else Document(markup, soup.original_encoding)
+    return build_index(soup, document, required_tags())
+
+
+class LexborNode:
+    # Минимальный адаптер узла selectolax под интерфейс, который ждут критерии
+    __slots__ = ('name', 'attrs', 'node')
+
+    def __init__(self, node):
+        self.name = node.tag
+        self.attrs = {key: '' if value is None else value for key, value in node.attributes.items()}
+        self.node = node
+
+
+def walk_lexbor(tree, visitor):
+    stack = [(tree.root, 1)] if tree.root is not None else []
+    while stack:
+        node, depth = stack.pop()
+        if node.next is not None:
+            stack.append((node.next, depth))
+        # Текст, комментарии и doctype имеют служебные имена (-text, -comment, !doctype)
+        if not node.tag[0].isalpha():
+            continue
+        wrapped = LexborNode(node)
+        visitor.visit(wrapped, wrapped.name, wrapped.attrs, depth)
+        if node.child is not None:
+            stack.append((node.child, depth + 1))
+
+
+def build_lexbor_index(markup):
+    index = TagIndex(Document(markup), required_tags())
+    walk_lexbor(LexborHTMLParser(markup), index)
+    return index.finish()
+
+
+def parse_index(markup, engine=None, parser=None, encoding=None):
+    # Индекс только для чтения: годится для оценки, но не для исправления ошибок
+    engine = engine or settings.HTML_SCORING_ENGINE
+    if engine == 'selectolax' and LexborHTMLParser is None:
+        _warn_fallback('selectolax', 'soup')
+    elif engine == 'selectolax':
+        if encoding and isinstance(markup, bytes):
+            markup = markup.decode(encoding, errors='replace')
+        return build_lexbor_index(markup)
+    return index_soup(make_soup(markup, parser, encoding), markup)
@@ -1,400 +1,407 @@
-from bs4 import BeautifulSoup
-import chardet
-import re
-import inspect
-import types
-
-
-
-def extract_contact_info(html):
-    # Регулярные выражения для поиска телефона, email и адреса
-    phone_regex = r'(?:\+?(\d[\d\s()]*)?(\([\d\s()]+\))?[\d\s()-]+\d|\+?7?\s?\(?(\d{3})\)?[-.\s]?\d{3}[-.\s]?\d{2}[-.\s]?\d{2})'
-    email_regex = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    address_regex = r'(?:\d{1,4}[\s.,-]?[\w\s.,-]{2,}(?:street|st|avenue|ave|road|rd|highway|hwy|square|sq|trail|trl|drive|dr|court|ct|park|pk|lane|ln|boulevard|blvd|circle|cir|plaza|plz|alley|aly|way|wy|point|pt|parkway|pkwy|commune|cm|district|dist|province|prov|region|reg|territory|terr|city|cty|town|tn|village|vlg|municipality|mun|county|cnty|state|st|country|cntry|ул|пр|просп|пер|ш|шоссе|бульв|бульвар|наб|набережн|пл|площ|площадь)\.?\s?[\w\s.-]{2,})(?:\d{1,4}[\s.,-]?[\w\s.,-]{2,})?(?:кв|комн|комната|офис|офис|к|квартира)\.?\s?\d{1,4}\b'
-
-    # Ищем контактную информацию в HTML-коде
-    contacts = {'phone': [], 'email': [], 'address': []}
-    contacts['phone'].extend([match[0] for match in re.findall(phone_regex, html)])
-    contacts['email'].extend(re.findall(email_regex, html))
-    contacts['address'].extend([match[0] for match in re.findall(address_regex, html)])
-
-    return contacts
-
-
-def check_figure(soup):
-    figures = soup.find_all('figure')
-    correct_figures = 0
-    errors = []
-
-    for i, figure in enumerate(figures):
-        if not figure.find('figcaption'):
-            error_msg = f'Отсутствует тег <figcaption> внутри тега <figure>'
-            errors.append(error_msg)
-        else:
-            correct_figures += 1
-
-    return correct_figures == len(figures), errors
-
-def check_summary_details(soup):
-    summaries = soup.find_all('summary')
-    errors = []
-
-    if not summaries:
-        error_msg = 'Постарайтесь использовать тэг <summary> для размещения краткого содержания или заголовка детализированного содержимого'
-        errors.append(error_msg)
-
-    return len(summaries) > 0, errors
-
-def check_blockquote(soup):
-    blockquotes = soup.find_all('blockquote')
-    errors = []
-
-    if not blockquotes:
-        error_msg = 'Постарайтесь использовать тэг <blockquote> для цитирования длинных фрагментов текста из внешних источников'
-        errors.append(error_msg)
-
-    return len(blockquotes) > 0, errors
-
-def check_cite(soup):
-    cites = soup.find_all('cite')
-    errors = []
-
-    if not cites:
-        error_msg = 'Постарайтесь использовать тэг <cite> для указания названия произведения или источника цитаты'
-        errors.append(error_msg)
-
-    return len(cites) > 0, errors
-
-def check_time(soup):
-    times = soup.find_all('time')
-    errors = []
-
-    if not times:
-        error_msg = 'Постарайтесь использовать тэг <time> для указания даты и/или времени'
-        errors.append(error_msg)
-
-    return len(times) > 0, errors
-
-def check_address(soup):
-    addresses = soup.find_all('address')
-    errors = []
-
-    if not addresses:
-        error_msg = 'Постарайтесь использовать тэг <address> для указания контактной информации автора или владельца сайта'
-        errors.append(error_msg)
-
-    return len(addresses) > 0, errors
-
-def check_abbr(soup):
-    abbrs = soup.find_all('abbr')
-    correct_abbrs = 0
-    errors = []
-
-    for i, abbr in enumerate(abbrs):
-        if 'title' not in abbr.attrs:
-            error_msg = f'Отсутствует атрибут title в теге <abbr>'
-            errors.append(error_msg)
-        else:
-            correct_abbrs += 1
-
-    return correct_abbrs == len(abbrs), errors
-
-def check_q(soup):
-    qs = soup.find_all('q')
-    errors = []
-
-    if not qs:
-        error_msg = 'Постарайтесь использовать тэг <q> для коротких цитат с автоматическим добавлением кавычек'
-        errors.append(error_msg)
-
-    return len(qs) > 0, errors
-
-def check_mark(soup):
-    marks = soup.find_all('mark')
-    errors = []
-
-    if not marks:
-        error_msg = 'Постарайтесь использовать тэг <mark> для выделения важной информации'
-        errors.append(error_msg)
-
-    return len(marks) > 0, errors
-
-def check_del_ins(soup):
-    del_ins = soup.find_all(['del', 'ins'])
-    errors = []
-
-    if not del_ins:
-        error_msg = 'Постарайтесь использовать тэги <del> для удаленного текста и <ins> для вставленного текста'
-        errors.append(error_msg)
-
-    return len(del_ins) > 0, errors
-
-
-
-
-def check_table(soup, file_path=None):
-    tables = soup.find_all('table')
-    errors = []
-    # encoding = get_encoding(file_path)
-
-    for i, table in enumerate(tables):
-        if not table.find('tr') or not (table.find('th') or table.find('td')):
-            pattern = re.compile(r'<table(?:\s|>)', re.IGNORECASE)
-            error_msg = f'Неправильное использование тега <table>'
-            errors.append(error_msg)
-
-    return len(errors) == 0, errors
-
-
-def check_logical_blocks(soup):
-    header = soup.find('header')
-    main = soup.find('main')
-    footer = soup.find('footer')
-    errors = []
-
-    if not header:
-        error_msg = 'Необходимо использовать тег <header> для обозначения шапки страницы'
-        errors.append(error_msg)
-
-    if not main:
-        error_msg = 'Необходимо использовать тег <main> для обозначения основного контента страницы'
-        errors.append(error_msg)
-
-    if not footer:
-        error_msg = 'Необходимо использовать тег <footer> для обозначения подвала страницы'
-        errors.append(error_msg)
-
-    return len(errors) == 0, errors
-
-def check_semantic_blocks(soup):
-    semantic_tags = {'nav', 'aside', 'article', 'section'}
-    errors = []
-
-    for tag in semantic_tags:
-        if not soup.find(tag):
-            error_msg = f'Постарайтесь использовать тег <{tag}> для разделения смысловых блоков на странице'
-            errors.append(error_msg)
-
-    return len(errors) == 0, errors
-
-def check_headings(soup):
-    headings = soup.find_all(lambda tag: tag.name.startswith('h'))
-    errors = []
-
-    if not headings:
-        error_msg = 'Постарайтесь использовать тэг <h> для обозначения заголовков'
-        errors.append(error_msg)
-
-    return len(errors) == 0, errors
-
-
-def check_nav_tag(soup, file_path=None):
-    nav_tags = soup.find_all('nav')
-    div_navs = soup.find_all(lambda tag: tag.name == 'div' and ('id' in tag.attrs and tag['id'] == 'nav' or 'class' in tag.attrs and 'nav' in tag['class']))
-
-    if len(nav_tags) > 0 and len(div_navs) == 0:
-        return True, []
-
-    errors = []
-    if len(div_navs) > 0:
-        error_msg = 'Нужно использовать nav вместо div с id/class=nav'
-        errors.append(error_msg)
-
-    return False, errors
-
-
-def correct_errors(soup, errors):
-    error_handlers = {
-        "Отсутствует тег <figcaption> внутри тега <figure>": handle_figcaption_error,
-        "Нужно использовать nav вместо div с id/class=nav": handle_nav_error,
-        "Необходимо использовать тег <header> для обозначения шапки страницы": handle_header_error,
-        "Необходимо использовать тег <main> для обозначения основного контента страницы": handle_main_error,
-        "Необходимо использовать тег <footer> для обозначения подвала страницы": handle_footer_error,
-        "Постарайтесь использовать тэг <address> для указания контактной информации автора или владельца сайта": handle_address_error
-    }
-
-    corrected_errors = []
-
-    for error in errors:
-        if error in error_handlers:
-            error_handlers[error](soup)
-            corrected_errors.append(error)
+import html
+from collections import defaultdict
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Literal, get_args
+from bs4 import Tag
+from core.metrics import Timings, profiled
+from htmls.contacts import contact_extractor, is_visible_text
+from htmls.criteria import CRITERIA, CRITERIA_SIGNATURE, decide_threshold, run_criteria, weighted_score
+from htmls.document import VOID_TAGS, Document, issue_locations
+from htmls.engine import build_index
+from htmls.parsers import index_soup, make_soup, parse_index
+
+
+
+def extract_contact_info(html, budget=None):
+    # Поиск телефонов, email и адресов: по текстовым узлам документа (soup)
+    # или по строке, заранее скомпилированными шаблонами и с ограничением по времени
+    return contact_extractor.extract(html, budget)
+
+
+FIGCAPTION_ERROR = "Отсутствует тег <figcaption> внутри тега <figure>"
+ADDRESS_ERROR = "Постарайтесь использовать тэг <address> для указания контактной информации автора или владельца сайта"
+
+# Ошибка -> (семантический тег, подстроки id/class у div, который им заменяется)
+DIV_REPLACEMENTS = {
+    "Нужно использовать nav вместо div с id/class=nav": ('nav', ('nav', 'navigation', 'navbar')),
+    "Необходимо использовать тег <header> для обозначения шапки страницы": ('header', ('header', 'head')),
+    "Необходимо использовать тег <main> для обозначения основного контента страницы": ('main', ('main', 'content')),
+    "Необходимо использовать тег <footer> для обозначения подвала страницы": ('footer', ('footer',)),
+}
+
+
+def is_correctable(error):
+    return error in DIV_REPLACEMENTS or error == FIGCAPTION_ERROR or error == ADDRESS_ERROR
+
+
+def correct_errors(soup, errors, index=None, edits=None):
+    # Все исправления за один проход по каждому виду узлов: div и figure берутся
+    # из индекса, собранного при оценке, контакты - со ссылками на свои узлы.
+    # edits - необязательный список, в который записываются правки для patch:
+    # что сделать и с каким по счёту тегом исходника (см. render_patch).
+    # truncated - поиск контактов остановлен по бюджету, и исправление адреса неполное
+    index = index or build_index(soup)
+    corrected_errors = [error for error in errors if is_correctable(error)]
+    corrected = dict.fromkeys(corrected_errors)
+    # Места тегов запоминаются до исправлений, которые переименовывают и добавляют теги
+    places = tag_places(soup) if edits is not None and ADDRESS_ERROR in corrected else None
+
+    # Правила в порядке ошибок: div, подходящий под несколько, получает тег первого
+    rules = [DIV_REPLACEMENTS[error] for error in corrected if error in DIV_REPLACEMENTS]
+    if rules:
+        handle_div_errors(index.find_all('div'), rules, edits)
+
+    if FIGCAPTION_ERROR in corrected:
+        handle_figcaption_error(soup, index, edits)
+
+    truncated = False
+    if ADDRESS_ERROR in corrected:
+        truncated = handle_address_error(soup, edits, places)
 
     # Удаляем исправленные ошибки из списка errors
     for error in corrected_errors:
         errors.remove(error)
 
-    return soup, corrected_errors
-
-def handle_figcaption_error(soup):
-    for figure in soup.find_all('figure'):
-        if not figure.find('figcaption'):
+    return soup, corrected_errors, truncated
+
+def handle_div_errors(divs, rules, edits=None):
+    for ordinal, div in enumerate(divs):
+        node_id = div.get('id') or ''
+        classes = div.get('class') or ''
+        if not isinstance(classes, str):
+            classes = ' '.join(classes)
+
+        for name, markers in rules:
+            if any(marker in node_id or marker in classes for marker in markers):
+                # Переименование сохраняет атрибуты и детей без их переноса
+                div.name = name
+                if edits is not None:
+                    edits.append(('rename', ('div', ordinal, len(divs)), name))
+                break
+
+def handle_figcaption_error(soup, index, edits=None):
+    figures = index.find_all('figure')
+    for ordinal, figure in enumerate(figures):
+        if not index.has_descendant(figure, 'figcaption'):
             figcaption = soup.new_tag('figcaption')
             # Перемещаем всех детей figure в figcaption
-            while len(figure.contents) > 0:
-                child = figure.contents[0]
-                child.extract()
-                figcaption.append(child)
+            figcaption.extend(figure.contents)
             # Добавляем figcaption в figure
             figure.append(figcaption)
-
-def handle_nav_error(soup):
-    selection_model = 'div[id*="nav"], div[class*="nav"], div[id*="navigation"], div[class*="navigation"], div[class*="navbar"], div[id*="navbar"]'
-    for div in soup.select(selection_model):
-        nav = soup.new_tag('nav')
-        # Объединяем атрибуты div и nav
-        nav.attrs.update(div.attrs)
-        # Перемещаем всех детей div в nav
-        while len(div.contents) > 0:
-            child = div.contents[0]
-            child.extract()
-            nav.append(child)
-        # Заменяем div на nav
-        div.replace_with(nav)
-
-def handle_header_error(soup):
-    selection_model = 'div[id*="header"], div[class*="header"], div[id*="head"], div[class*="head"]'
-    for div in soup.select(selection_model):
-        header = soup.new_tag('header')
-        # Объединяем атрибуты div и header
-        header.attrs.update(div.attrs)
-        # Перемещаем всех детей div в header
-        while len(div.contents) > 0:
-            child = div.contents[0]
-            child.extract()
-            header.append(child)
-        # Заменяем div на header
-        div.replace_with(header)
-
-def handle_main_error(soup):
-    selection_model = 'div[id*="main"], div[class*="main"], div[id*="content"], div[class*="content"]'
-    for div in soup.select(selection_model):
-        main = soup.new_tag('main')
-        # Объединяем атрибуты div и main
-        main.attrs.update(div.attrs)
-        # Перемещаем всех детей div в main
-        while len(div.contents) > 0:
-            child = div.contents[0]
-            child.extract()
-            main.append(child)
-        # Заменяем div на nav
-        div.replace_with(main)
-
-def handle_footer_error(soup):
-    selection_model = 'div[id*="footer"], div[class*="footer"]'
-    for div in soup.select(selection_model):
-        footer = soup.new_tag('footer')
-        # Объединяем атрибуты div и nav
-        footer.attrs.update(div.attrs)
-        # Перемещаем всех детей div в nav
-        while len(div.contents) > 0:
-            child = div.contents[0]
-            child.extract()
-            footer.append(child)
-        # Заменяем div на nav
-        div.replace_with(footer)
-
-def handle_address_error(soup):
-    # Находим контактную информацию
-    contact_info = extract_contact_info(str(soup))
+            if edits is not None:
+                edits.append(('wrap', ('figure', ordinal, len(figures)), 'figcaption'))
+
+def handle_address_error(soup, edits=None, places=None):
+    # Один обход дерева: видимый текст для поиска контактов и ссылки tel:/mailto: по href
+    texts = []
+    links = defaultdict(list)
+    for node in soup.descendants:
+        if isinstance(node, Tag):
+            if node.name == 'a' and node.get('href'):
+                links[node['href']].append(node)
+        elif is_visible_text(node):
+            texts.append(node)
+
+    # Находим контактную информацию вместе с узлами, где она встретилась
+    contact_info, truncated = contact_extractor.find(texts)
+
+    # Границы текстовых узлов с адресами - по соседям до того, как дерево изменится
+    bounds = {}
+    if edits is not None:
+        for _, node in contact_info['address']:
+            bounds[id(node)] = text_bounds(node, places)
 
     # Создаем тег <address>
     address = soup.new_tag('address')
-
-    # Добавляем контактную информацию в тег <address>
-    for label, texts in contact_info.items():
-        for text in texts:
-            if text:
-                if label == 'phone':
-                    phone = soup.new_tag('a', href=f'tel:{text}')
-                    phone.string = text
-                    address.append(phone)
-                elif label == 'email':
-                    email = soup.new_tag('a', href=f'mailto:{text}')
-                    email.string = text
-                    address.append(email)
-                elif label == 'address':
-                    address_text = soup.new_tag('p')
-                    address_text.string = text
-                    address.append(address_text)
-
-    # Добавляем тег <address> в конец тега <body>
-    body = soup.body
+    extracted = set()
+
+    for label, matches in contact_info.items():
+        for text, node in matches:
+            if label == 'phone' or label == 'email':
+                href = f'tel:{text}' if label == 'phone' else f'mailto:{text}'
+                link = soup.new_tag('a', href=href)
+                link.string = text
+                address.append(link)
+                # Существующую ссылку с тем же адресом переносим, убирая из исходного места
+                if links[href]:
+                    moved = links[href].pop(0)
+                    if edits is not None:
+                        place = places.get(id(moved))
+                        bounds_of_link = ((place, 'start'), (place, 'end')) if place is not None else (None, None)
+                        edits.append(('remove', *bounds_of_link, None))
+                    moved.extract()
+            elif label == 'address':
+                address_text = soup.new_tag('p')
+                address_text.string = text
+                address.append(address_text)
+                # Удаляем текстовый узел с адресом из исходного места
+                if id(node) not in extracted:
+                    extracted.add(id(node))
+                    if edits is not None:
+                        edits.append(('remove', *bounds[id(node)], str(node)))
+                    node.extract()
+
+    # Добавляем тег <address> в конец тега <body> (во фрагменте без body - в конец документа)
+    body = soup.body or soup
     body.append(address)
+    if edits is not None:
+        edits.append(('append', address))
+    return truncated
+
+
+def tag_places(soup):
+    # id тега -> (имя, номер среди тегов с тем же именем, сколько их в дереве)
+    ordinals = {}
+    counts = defaultdict(int)
+    for node in soup.descendants:
+        if isinstance(node, Tag):
+            ordinals[id(node)] = (node.name, counts[node.name])
+            counts[node.name] += 1
+    return {key: (name, ordinal, counts[name]) for key, (name, ordinal) in ordinals.items()}
+
+
+def text_bounds(node, places):
+    # Начало и конец текстового узла в исходнике как (тег, сторона): конец
+    # предыдущего соседа или открывающего тега родителя и начало следующего
+    # соседа или закрывающего тега родителя; тег None - сам документ.
+    # None вместо границы - соседом оказался комментарий или тег, добавленный исправлением
+    def bound(tag, side):
+        if tag.name == '[document]':
+            return None, side
+        place = places.get(id(tag))
+        return (place, side) if place is not None else None
+
+    before, after = node.previous_sibling, node.next_sibling
+    if before is None:
+        start = bound(node.parent, 'open_end')
+    else:
+        start = bound(before, 'end') if isinstance(before, Tag) else None
+    if after is None:
+        end = bound(node.parent, 'close_start')
+    else:
+        end = bound(after, 'start') if isinstance(after, Tag) else None
+    return start, end
+
+
+def calculate_score(index, file_path, criteria, timings=None):
+    correct_criteria = []
+    all_errors = []
+    passed = []
 
-    # Удаляем контактную информацию из исходного места
-    for label, texts in contact_info.items():
-        for text in texts:
-            if text:
-                if label == 'phone':
-                    phone_tag = soup.find('a', href=f'tel:{text}')
-                    phone_tag.extract()
-                elif label == 'email':
-                    email_tag = soup.find('a', href=f'mailto:{text}')
-                    email_tag.extract()
-                elif label == 'address':
-                    address_text = soup.find(string=re.compile(re.escape(text)))
-                    address_text.extract()
+    for criterion, is_correct, errors in run_criteria(index, criteria, file_path, timings):
+        correct_criteria.append(1 if is_correct else 0)
+        passed.append((criterion, is_correct))
+        all_errors.extend(errors)
 
+    score = weighted_score(passed)
+    return correct_criteria, all_errors, score
 
+# Увеличивать при изменении исправлений или формата результата; версии самих
+# критериев входят через CRITERIA_SIGNATURE. От значения зависит ключ кэша.
+CRITERIA_VERSION = f'7/{CRITERIA_SIGNATURE}'
+
+
+def score_html(html_content, engine=None, parser=None):
+    # Только оценка, без исправления: можно использовать любой движок разбора
+    index = parse_index(html_content, engine, parser)
+    score, errors, ratio = calculate_score(index, None, CRITERIA)
+
+    return {'recommendations': [str(error) for error in errors], 'locations': issue_locations(errors), 'score': ratio}
+
+
+# Как вернуть исправленный документ: prettified - prettify(), minimal - str(soup)
+# без переформатирования, patch - только правки в виде замен в исходном тексте
+OutputMode = Literal['prettified', 'minimal', 'patch']
+OUTPUT_MODES = get_args(OutputMode)
+
+# Объём работы: full - оценка, рекомендации и исправленный документ; score-only -
+# только оценка; threshold - только ответ, достигает ли оценка порога
+AnalysisMode = Literal['full', 'score-only', 'threshold']
+ANALYSIS_MODES = get_args(AnalysisMode)
+
+
+def render_patch(document, edits, corrected):
+    # Правки в виде замен [{'start', 'end', 'text'}] в исходном тексте, по возрастанию
+    # start; смещения - в символах декодированного документа, каким его прислали.
+    # Теги правок ищутся в исходнике по номеру среди тегов с тем же именем. Если
+    # место какой-то правки найти нельзя (у элемента нет закрывающего тега, число
+    # тегов в тексте не совпало с деревом, текст узла окружён комментариями),
+    # возвращается одна замена всего документа исправленной сериализацией corrected()
+    replacements = []
+    for kind, *args in edits:
+        if kind == 'rename':
+            # Меняется только имя в открывающем и закрывающем тегах, атрибуты остаются
+            target, new_name = args
+            start, close_start = source_offset(document, (target, 'start')), source_offset(document, (target, 'close_start'))
+            if start is None or close_start is None:
+                break
+            length = len(target[0])
+            replacements.append((start + 1, start + 1 + length, new_name))
+            replacements.append((close_start + 2, close_start + 2 + length, new_name))
+        elif kind == 'wrap':
+            # Всё содержимое элемента оборачивается в новый тег
+            target, name = args
+            open_end, close_start = source_offset(document, (target, 'open_end')), source_offset(document, (target, 'close_start'))
+            if open_end is None or close_start is None:
+                break
+            replacements.append((open_end, open_end, f'<{name}>'))
+            replacements.append((close_start, close_start, f'</{name}>'))
+        elif kind == 'remove':
+            start_bound, end_bound, text = args
+            start, end = source_offset(document, start_bound), source_offset(document, end_bound)
+            if start is None or end is None or start > end:
+                break
+            # Текстовый узел сверяется с исходником: между соседями должен быть ровно он
+            if text is not None and normalize_text(document.source[start:end]) != normalize_text(text):
+                break
+            replacements.append((start, end, ''))
+        elif kind == 'append':
+            # В конец body: перед </body>, а во фрагменте без body - в конец документа
+            bodies = document.tag_spans('body')
+            if len(bodies) > 1 or bodies and bodies[0][2] is None:
+                break
+            position = bodies[0][2] if bodies else len(document.source)
+            replacements.append((position, position, str(args[0])))
+    else:
+        replacements.sort(key=lambda replacement: replacement[:2])
+        # Правки не должны пересекаться (например, удалённый текст внутри удалённой ссылки)
+        if all(previous[1] <= current[0] for previous, current in zip(replacements, replacements[1:])):
+            return [{'start': start, 'end': end, 'text': text} for start, end, text in replacements]
+
+    return [{'start': 0, 'end': len(document.source), 'text': corrected()}]
+
+
+def source_offset(document, bound):
+    # Смещение в исходнике для (тег, сторона), где тег - (имя, номер, сколько их
+    # в дереве) или None для самого документа; None, если места нет
+    target, side = bound if bound is not None else (None, None)
+    if side is None:
+        return None
+    if target is None:
+        return 0 if side == 'open_end' else len(document.source)
+
+    span = document.tag_span(*target)
+    if span is None:
+        return None
+    start, open_end, close_start, close_end = span
+    if side == 'end' and close_end is None and target[0] in VOID_TAGS:
+        return open_end
+    return {'start': start, 'open_end': open_end, 'close_start': close_start, 'end': close_end}[side]
+
+
+def normalize_text(text):
+    # Текст узла так, как его видит парсер: без сущностей и с переводами строк \n
+    return html.unescape(text).replace('\r\n', '\n').replace('\r', '\n')
+
+
+def analyze_html(html_content, encoding=None, output='prettified', timings=None, failed=None):
+    # timings - необязательный Timings: время чтения, разбора, построения индекса,
+    # критериев (и каждого критерия отдельно), исправления и сериализации;
+    # failed - необязательный список, в который добавляются id непройденных критериев
+    timings = timings or Timings()
+
+    with timings.stage('read'):
+        # Большие загрузки приходят в воркер путём к временному файлу, а не байтами
+        if isinstance(html_content, Path):
+            html_content = html_content.read_bytes()
+
+    with timings.stage('parse'):
+        soup = make_soup(html_content, encoding=encoding)
+    with timings.stage('index'):
+        index = index_soup(soup, html_content)
+
+    with timings.stage('criteria'):
+        score, errors, ratio = calculate_score(index, None, CRITERIA, timings)
+        if failed is not None:
+            failed.extend(criterion.id for criterion, passed in zip(CRITERIA, score) if not passed)
+
+    with timings.stage('locations'):
+        # Места ошибок считаются по исходному документу, до исправлений
+        locations = issue_locations(errors)
+
+    edits = [] if output == 'patch' else None
+    with timings.stage('correction'):
+        corrected_soup, corrected_errors, truncated = correct_errors(soup, errors, index, edits)
+
+    result = {
+        'corrected_errors': [str(error) for error in corrected_errors],
+        'recommendations': [str(error) for error in errors],
+        'locations': locations,
+        'score': ratio,
+        'truncated': truncated,
+    }
+    with timings.stage('serialization'):
+        if output == 'patch':
+            # Исходный текст берётся из индекса, если тот уже искал по нему позиции тегов
+            document = index.document or Document(html_content, soup.original_encoding)
+            result['patch'] = render_patch(document, edits, lambda: str(corrected_soup))
+        elif output == 'minimal':
+            result['corrected_html'] = str(corrected_soup)
+        else:
+            result['corrected_html'] = corrected_soup.prettify()
 
+    return result
 
-def get_encoding(file_path):
-    with open(file_path, 'rb') as f:
-        rawdata = f.read()
-    result = chardet.detect(rawdata)
-    encoding = result.get('encoding')
 
-    if encoding is None:
-        encoding = 'utf-8'
+def score_document(html_content, encoding=None, timings=None, failed=None):
+    # Режим score-only: все критерии, но без мест ошибок, исправления и сериализации.
+    # Документ только читается, поэтому годится быстрый движок разбора
+    timings = timings or Timings()
 
-    try:
-        text = rawdata.decode(encoding)
-    except UnicodeDecodeError:
-        encoding = 'iso-8859-1'
-        text = rawdata.decode(encoding)
+    with timings.stage('read'):
+        if isinstance(html_content, Path):
+            html_content = html_content.read_bytes()
 
-    return encoding
+    with timings.stage('parse'):
+        index = parse_index(html_content, encoding=encoding)
 
+    with timings.stage('criteria'):
+        passed = [(criterion, is_correct) for criterion, is_correct, _ in run_criteria(index, CRITERIA, timings=timings)]
+    if failed is not None:
+        failed.extend(criterion.id for criterion, is_correct in passed if not is_correct)
 
-def calculate_score(soup, file_path, criteria):
-    total_criteria = len(criteria)
-    correct_criteria = [0] * total_criteria
-    all_errors = []
+    return {'score': weighted_score(passed)}
 
-    for i, criterion in enumerate(criteria):
-        is_correct, errors = criterion(soup, file_path) if isinstance(criterion, types.FunctionType) and 'file_path' in inspect.signature(criterion).parameters else criterion(soup)
-        correct_criteria[i] = 1 if is_correct else 0
-        all_errors.extend(errors)
 
-    score = sum(correct_criteria) / total_criteria if total_criteria > 0 else 0
-    return correct_criteria, all_errors, score
+def threshold_document(html_content, threshold, encoding=None, timings=None):
+    # Режим threshold: критерии проверяются, пока исход относительно порога не определён.
+    # Точная оценка неизвестна - возвращаются её границы
+    timings = timings or Timings()
+
+    with timings.stage('read'):
+        if isinstance(html_content, Path):
+            html_content = html_content.read_bytes()
+
+    with timings.stage('parse'):
+        index = parse_index(html_content, encoding=encoding)
+
+    with timings.stage('criteria'):
+        passed, score_min, score_max, evaluated = decide_threshold(index, threshold, timings=timings)
 
-async def process_html(html_content):
-    soup = BeautifulSoup(html_content, 'html.parser')
-
-    criteria = [
-        check_table,
-        check_logical_blocks,
-        check_semantic_blocks,
-        check_headings,
-        check_nav_tag,
-        check_figure,
-        check_summary_details,
-        check_blockquote,
-        check_cite,
-        check_time,
-        check_address,
-        check_abbr,
-        check_q,
-        check_mark,
-        check_del_ins
-    ]
-
-    score, errors, ratio = calculate_score(soup, None, criteria)
-
-    corrected_soup, corrected_errors = correct_errors(soup, errors)
-    corrected_html = corrected_soup.prettify()
-
-    return {'corrected_html': corrected_html, 'corrected_errors': corrected_errors, 'recommendations': errors, 'score': ratio}
+    return {
+        'passed': passed,
+        'threshold': threshold,
+        'score_min': score_min,
+        'score_max': score_max,
+        'evaluated': evaluated,
+        'criteria': len(CRITERIA),
+    }
+
+
+def analyze_timed(html_content, encoding=None, output='prettified', profile_dir=None, mode='full', threshold=None):
+    # Для пула воркеров: результат, время стадий и непройденные критерии.
+    # С profile_dir вызов идёт под cProfile, а профиль сохраняется в этот каталог.
+    # В режиме threshold проверяются не все критерии, поэтому непройденные не собираются
+    timings = Timings()
+    failed = []
+
+    with profiled(profile_dir, mode) if profile_dir is not None else nullcontext():
+        if mode == 'score-only':
+            result = score_document(html_content, encoding, timings, failed)
+        elif mode == 'threshold':
+            result = threshold_document(html_content, threshold, encoding, timings)
+        else:
+            result = analyze_html(html_content, encoding, output, timings, failed)
 
+    return result, timings.durations, failed
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import time
+from fastapi.exceptions import HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from core.config import get_settings
+from pathlib import Path
+from core.metrics import metrics, observe_timings, profile_sampler, server_timing
+from htmls.batch import open_batch
+from htmls.cache import cache_key, content_digest, result_cache
+from htmls.ingest import read_upload
+from htmls.process_html import CRITERIA_VERSION, analyze_timed
+from htmls.workers import analysis_pool
+
+settings = get_settings()
+
+# Корзины размера документа для метрики длительности анализа: (верхняя граница, метка)
+SIZE_BUCKETS = ((10 * 1024, '10KB'), (100 * 1024, '100KB'), (1024 * 1024, '1MB'), (10 * 1024 * 1024, '10MB'))
+
+metrics.describe('analysis_duration_seconds', 'Время анализа документа (с ожиданием воркера) по размеру')
+metrics.describe('analysis_criterion_failures_total', 'Проанализированные документы, не прошедшие критерий')
+
+
+def size_bucket(source):
+    size = source.stat().st_size if isinstance(source, Path) else len(source)
+    for limit, label in SIZE_BUCKETS:
+        if size <= limit:
+            return label
+    return 'larger'
+
+
+def check_mode(mode, threshold):
+    if mode == 'threshold' and threshold is None:
+        raise HTTPException(status_code=422, detail="threshold is required when mode=threshold.")
+
+
+async def _analyze(source, digest=None, encoding=None, output='prettified', mode='full', threshold=None, timeout=None, wait=False):
+    # timeout и wait передаются пулу: у фоновых задач свой срок, и они ждут слота, а не получают 503
+    digest = digest or content_digest(source)
+    if mode == 'full':
+        key = cache_key(digest, CRITERIA_VERSION, settings.HTML_PARSER, encoding, output)
+    else:
+        # Оценка без исправления строится движком для оценки, а вид вывода ей не важен
+        key = cache_key(digest, CRITERIA_VERSION, settings.HTML_SCORING_ENGINE, settings.HTML_PARSER, encoding, mode, threshold)
+    result, tier = await result_cache.get(key)
+    timings = {}
+
+    if result is None:
+        started = time.perf_counter()
+        result, timings, failed = await analysis_pool.run(
+            analyze_timed, source, encoding, output, profile_sampler.sample(), mode, threshold,
+            key=key, timeout=timeout, wait=wait,
+        )
+        elapsed = time.perf_counter() - started
+        # Ожидание свободного воркера и передача данных между процессами
+        timings['queue'] = max(0, elapsed - sum(
+            seconds for name, seconds in timings.items() if not name.startswith('criterion.')
+        ))
+        observe_timings(timings)
+        metrics.observe('analysis_duration_seconds', elapsed, size=size_bucket(source), mode=mode)
+        for criterion in failed:
+            metrics.inc('analysis_criterion_failures_total', criterion=criterion)
+        # Исправление, у которого кончился бюджет поиска контактов, неполное:
+        # в кэше оно выдавалось бы за полный результат для этого документа
+        if not result.get('truncated'):
+            result_cache.set(key, result)
+
+    return result, tier, timings
+
+
+async def analyze_upload(file, output='prettified', mode='full', threshold=None):
+    check_mode(mode, threshold)
+    started = time.perf_counter()
+    document = await read_upload(file)
+    upload = time.perf_counter() - started
+    try:
+        result, tier, timings = await _analyze(
+            document.source, document.digest, document.encoding, output, mode, threshold
+        )
+    finally:
+        document.cleanup()
+
+    return _analysis_response(result, tier, {'upload': upload, **timings})
+
+
+async def analyze_document(html_content, output='prettified', mode='full', threshold=None):
+    check_mode(mode, threshold)
+    result, tier, timings = await _analyze(html_content, output=output, mode=mode, threshold=threshold)
+    return _analysis_response(result, tier, timings)
+
+
+def _analysis_response(result, tier, timings=None):
+    if tier is None:
+        headers = {"X-Cache": "MISS"}
+    else:
+        headers = {"X-Cache": "HIT", "X-Cache-Tier": tier}
+
+    if settings.ANALYSIS_SERVER_TIMING and timings:
+        headers["Server-Timing"] = server_timing(timings)
+
+    return JSONResponse(content=result, headers=headers)
+
+
+def _read_entry(read):
+    source = read()
+    return source, content_digest(source)
+
+
+async def _analyze_entry(position, file_name, read, output, timeout=None, wait=False):
+    try:
+        # Распаковка записи архива и хэш документа - в потоке, не в event loop
+        source, digest = await asyncio.get_running_loop().run_in_executor(None, _read_entry, read)
+        result, tier, _ = await _analyze(source, digest, output=output, timeout=timeout, wait=wait)
+    except HTTPException as e:
+        return {'index': position, 'file_name': file_name, 'error': e.detail, 'status_code': e.status_code}
+    except Exception as e:
+        # Ошибка в одном документе не должна ронять весь пакет
+        return {'index': position, 'file_name': file_name, 'error': repr(e), 'status_code': 500}
+
+    return {'index': position, 'file_name': file_name, 'cache': 'MISS' if tier is None else 'HIT', **result}
+
+
+async def iter_batch_results(entries, output='prettified', timeout=None, wait=False):
+    # Документы отдаются воркерам не больше, чем их есть в пуле, поэтому пакет
+    # не переполняет общую очередь и в памяти лежат только обрабатываемые файлы.
+    # timeout и wait - как у _analyze: фоновая задача передаёт свой срок и ждёт слота
+    semaphore = asyncio.Semaphore(analysis_pool.workers)
+    finished = asyncio.Queue()
+    tasks = set()
+
+    async def run(position, file_name, read):
+        try:
+            await finished.put(await _analyze_entry(position, file_name, read, output, timeout, wait))
+        finally:
+            semaphore.release()
+
+    yielded = 0
+    for position, (file_name, read) in enumerate(entries):
+        await semaphore.acquire()
+        task = asyncio.create_task(run(position, file_name, read))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+        while not finished.empty():
+            yielded += 1
+            yield finished.get_nowait()
+
+    while yielded < len(entries):
+        yielded += 1
+        yield await finished.get()
+
+
+def batch_summary(scores, failed):
+    return {
+        'processed': len(scores),
+        'failed': failed,
+        'score': sum(scores) / len(scores) if scores else 0,
+    }
+
+
+def batch_result(results):
+    results.sort(key=lambda result: result['index'])
+    scores = [result['score'] for result in results if 'error' not in result]
+    return {'results': results, **batch_summary(scores, len(results) - len(scores))}
+
+
+async def analyze_batch(files, stream=False, output='prettified'):
+    # Оглавление архива читается из загруженного файла, поэтому тоже в потоке
+    entries = await asyncio.get_running_loop().run_in_executor(None, open_batch, files)
+
+    if stream:
+        async def ndjson():
+            scores, failed = [], 0
+            async for result in iter_batch_results(entries, output):
+                if 'error' in result:
+                    failed += 1
+                else:
+                    scores.append(result['score'])
+                yield json.dumps(result, ensure_ascii=False) + '\n'
+            yield json.dumps({'summary': batch_summary(scores, failed)}, ensure_ascii=False) + '\n'
+
+        return StreamingResponse(ndjson(), media_type='application/x-ndjson')
+
+    results = [result async for result in iter_batch_results(entries, output)]
+    return JSONResponse(content=batch_result(results))
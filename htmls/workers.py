@@ -0,0 +1,171 @@
+import asyncio
+import signal
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from fastapi.exceptions import HTTPException
+from core.config import get_settings
+from core.metrics import metrics
+
+settings = get_settings()
+
+# Сколько ещё ждать воркер после его собственного срока, прежде чем ответить 504:
+# сигнал прерывает только Python-код, и выход из C-функции может занять время
+DEADLINE_GRACE_SECONDS = 1
+
+
+class AnalysisTimeout(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise AnalysisTimeout()
+
+
+def run_with_deadline(deadline, func, *args):
+    # Выполняется в процессе воркера. deadline - время (time.time()), после которого
+    # результат уже никому не нужен: документ, дождавшийся воркера слишком поздно,
+    # не анализируется, а начатый анализ прерывается сигналом, и воркер сразу
+    # свободен для следующего документа. Без setitimer (Windows) срок не прерывает анализ,
+    # без deadline (None) анализ не ограничен
+    if deadline is None:
+        return func(*args)
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        raise AnalysisTimeout()
+    if not hasattr(signal, 'setitimer'):
+        return func(*args)
+
+    previous = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, remaining)
+    try:
+        return func(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+class AnalysisPool:
+    # Пул процессов для анализа HTML: разбор и исправление занимают CPU,
+    # поэтому выполняются вне event loop. Очередь ограничена: если все
+    # воркеры заняты и очередь заполнена, запрос сразу получает 503.
+    # Срок запроса действует и внутри воркера (run_with_deadline), поэтому
+    # документ после 504 не продолжает занимать процесс. Повторная отправка
+    # документа, который ещё анализируется, ждёт тот же анализ, а не запускает второй.
+    # Фоновые задачи передают свой срок и wait=True: вместо 503 они ждут свободного слота.
+
+    def __init__(self, workers, queue_size, timeout):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.pending = 0
+        self._executor = None
+        self._running = {}
+        self._waiters = deque()
+
+    @property
+    def capacity(self):
+        return self.workers + self.queue_size
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def _release(self, future):
+        self.pending -= 1
+        self._wake()
+        # Забираем исключение, чтобы asyncio не ругался на задачи, брошенные по таймауту
+        if not future.cancelled():
+            future.exception()
+
+    async def _acquire(self, wait):
+        while self.pending >= self.capacity:
+            if not wait:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Analysis queue is full. Please try again later.",
+                    headers={"Retry-After": "1"},
+                )
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # Слот, отданный уже отменённому вызову, переходит следующему
+                if waiter.done() and not waiter.cancelled():
+                    self._wake()
+                raise
+
+    def _wake(self):
+        # Освободившийся слот достаётся первому из ждущих
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+    def _submit(self, deadline, func, *args):
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(self._get_executor(), run_with_deadline, deadline, func, *args)
+        except BrokenProcessPool:
+            self._executor = None
+            future = loop.run_in_executor(self._get_executor(), run_with_deadline, deadline, func, *args)
+
+        # Слот освобождается только когда процесс действительно закончил работу,
+        # даже если клиент уже получил ответ по таймауту
+        self.pending += 1
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, func, *args, key=None, timeout=None, wait=False):
+        # key - ключ результата (например, ключ кэша): одинаковые документы
+        # анализируются один раз, пока первый анализ не закончится.
+        # timeout - срок вместо общего для пула, 0 - без срока
+        timeout = (self.timeout if timeout is None else timeout) or None
+
+        future, running_deadline = self._running.get(key, (None, None))
+        # Анализ с более ранним сроком может не дожить до результата, нужного этому вызову
+        if future is None or (running_deadline is not None and (
+            timeout is None or running_deadline < time.time() + timeout
+        )):
+            await self._acquire(wait)
+            # Срок отсчитывается с момента, когда документ получил место в пуле
+            deadline = time.time() + timeout if timeout is not None else None
+            future = self._submit(deadline, func, *args)
+            if key is not None:
+                self._running[key] = future, deadline
+                future.add_done_callback(partial(self._forget, key))
+
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(future), timeout + DEADLINE_GRACE_SECONDS if timeout is not None else None
+            )
+        except (asyncio.TimeoutError, AnalysisTimeout):
+            raise HTTPException(status_code=504, detail="Analysis timed out.")
+        except BrokenProcessPool:
+            self._executor = None
+            raise HTTPException(status_code=503, detail="Analysis worker crashed. Please try again later.")
+
+    def _forget(self, key, future):
+        if self._running.get(key, (None,))[0] is future:
+            del self._running[key]
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+analysis_pool = AnalysisPool(
+    workers=settings.ANALYSIS_WORKERS,
+    queue_size=settings.ANALYSIS_QUEUE_SIZE,
+    timeout=settings.ANALYSIS_TIMEOUT_SECONDS,
+)
+metrics.collect('analysis_pool_tasks', 'gauge', 'Документы в работе и в очереди пула анализа', lambda: [
+    ({'state': 'running'}, min(analysis_pool.pending, analysis_pool.workers)),
+    ({'state': 'queued'}, max(analysis_pool.pending - analysis_pool.workers, 0)),
+])
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, func
+
+from core.database import Base
+
+
+class JobModel(Base):
+    __tablename__ = "analysis_jobs"
+    id = Column(String(36), primary_key=True)
+    status = Column(String(20), nullable=False, default='pending', index=True)  # pending, running, done, failed
+    total = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    result = Column(JSON, nullable=True, default=None)
+    error = Column(Text, nullable=True, default=None)
+    expires_at = Column(DateTime, nullable=True, default=None, index=True)
+    updated_at = Column(DateTime, nullable=False, server_default=func.now())
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
@@ -0,0 +1,11 @@
+from pydantic import BaseModel
+from typing import Union
+
+
+class JobResponse(BaseModel):
+    id: str
+    status: str
+    total: int
+    completed: int
+    result: Union[None, dict] = None
+    error: Union[None, str] = None
@@ -0,0 +1,27 @@
+from typing import List
+from fastapi import APIRouter, status, Depends, File, UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database import get_db
+from jobs.responses import JobResponse
+from htmls.process_html import OutputMode
+from jobs.services import create_analysis_job, get_analysis_job
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["Jobs"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+@router.post('', status_code=status.HTTP_202_ACCEPTED, response_model=JobResponse)
+async def create_job(
+    files: List[UploadFile] = File(...),
+    output: OutputMode = 'prettified',
+    db: AsyncSession = Depends(get_db),
+):
+    return await create_analysis_job(files=files, db=db, output=output)
+
+
+@router.get('/{job_id}', status_code=status.HTTP_200_OK, response_model=JobResponse)
+async def get_job(job_id: str, db: AsyncSession = Depends(get_db)):
+    return await get_analysis_job(job_id=job_id, db=db)
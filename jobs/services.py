@@ -0,0 +1,202 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import uuid
+from datetime import datetime, timedelta
+from functools import partial
+from fastapi.exceptions import HTTPException
+from core.config import get_settings
+from sqlalchemy import select, update, delete
+from core.database import SessionLocal
+from htmls.batch import open_batch
+from htmls.services import iter_batch_results, batch_result
+from jobs.models import JobModel
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Ссылки на запущенные задачи, чтобы их не собрал сборщик мусора
+_running = set()
+_maintenance = None
+
+
+async def create_analysis_job(files, db, output='prettified'):
+    job_id = str(uuid.uuid4())
+    # Распаковка архива и запись на диск идут в потоке, не останавливая event loop
+    entries = await asyncio.get_running_loop().run_in_executor(None, _spool_job, files, _job_dir(job_id), output)
+
+    job = JobModel(id=job_id, status='pending', total=len(entries), completed=0, updated_at=datetime.now())
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+
+    _schedule(job_id)
+    return job
+
+
+async def get_analysis_job(job_id, db):
+    result = await db.execute(select(JobModel).filter(JobModel.id == job_id))
+    job = result.scalars().first()
+    if not job or (job.expires_at and job.expires_at < datetime.now()):
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+def start_job_maintenance():
+    global _maintenance
+    _maintenance = asyncio.create_task(_maintain_jobs())
+
+
+def stop_job_maintenance():
+    if _maintenance is not None:
+        _maintenance.cancel()
+    for task in list(_running):
+        task.cancel()
+
+
+def _job_dir(job_id):
+    return os.path.join(settings.JOB_SPOOL_DIR, job_id)
+
+
+def _spool_job(files, job_dir, output):
+    # Входные документы сохраняются на диск: после перезапуска воркера задачу можно продолжить
+    entries = open_batch(files)
+    os.makedirs(job_dir)
+    names = []
+    for position, (file_name, read) in enumerate(entries):
+        with open(os.path.join(job_dir, str(position)), 'wb') as f:
+            f.write(read())
+        names.append(file_name)
+    with open(os.path.join(job_dir, 'names.json'), 'w', encoding='utf-8') as f:
+        json.dump(names, f, ensure_ascii=False)
+    with open(os.path.join(job_dir, 'options.json'), 'w', encoding='utf-8') as f:
+        json.dump({'output': output}, f)
+    return entries
+
+
+def _load_entries(job_dir):
+    with open(os.path.join(job_dir, 'names.json'), encoding='utf-8') as f:
+        names = json.load(f)
+    return [(file_name, partial(_read_file, os.path.join(job_dir, str(position)))) for position, file_name in enumerate(names)]
+
+
+def _load_options(job_dir):
+    # Задачи, созданные до появления options.json, считаются с настройками по умолчанию
+    path = os.path.join(job_dir, 'options.json')
+    if not os.path.exists(path):
+        return {'output': 'prettified'}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+async def _update_job(job_id, **values):
+    values['updated_at'] = datetime.now()
+    async with SessionLocal() as db:
+        await db.execute(update(JobModel).filter(JobModel.id == job_id).values(**values))
+        await db.commit()
+
+
+def _expires_at():
+    return datetime.now() + timedelta(seconds=settings.JOB_TTL_SECONDS)
+
+
+def _schedule(job_id):
+    task = asyncio.create_task(_run_job(job_id))
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+
+
+async def _run_job(job_id):
+    job_dir = _job_dir(job_id)
+
+    try:
+        entries = _load_entries(job_dir)
+        options = _load_options(job_dir)
+        await _update_job(job_id, status='running', completed=0)
+
+        # Задача не ограничена сроком интерактивного запроса и не получает 503 от
+        # заполненной очереди: документ ждёт свободного воркера, а не записывается в ошибки
+        heartbeat = asyncio.create_task(_heartbeat(job_id))
+        try:
+            results = []
+            async for result in iter_batch_results(
+                entries, options['output'], timeout=settings.JOB_ANALYSIS_TIMEOUT_SECONDS, wait=True
+            ):
+                results.append(result)
+                await _update_job(job_id, completed=len(results))
+        finally:
+            heartbeat.cancel()
+
+        await _update_job(job_id, status='done', result=batch_result(results), expires_at=_expires_at())
+    except Exception as e:
+        logger.exception("Analysis job %s failed", job_id)
+        await _update_job(job_id, status='failed', error=repr(e), expires_at=_expires_at())
+
+    shutil.rmtree(job_dir, ignore_errors=True)
+
+
+async def _heartbeat(job_id):
+    # Пока документ долго анализируется или ждёт воркера, задача обновляет updated_at,
+    # чтобы обход не счёл её брошенной и не запустил повторно
+    while True:
+        await asyncio.sleep(settings.JOB_STALE_SECONDS / 3)
+        try:
+            await _update_job(job_id)
+        except Exception:
+            logger.exception("Analysis job %s heartbeat failed", job_id)
+
+
+async def _maintain_jobs():
+    while True:
+        try:
+            await _sweep_jobs()
+        except Exception:
+            logger.exception("Analysis job maintenance failed")
+        await asyncio.sleep(settings.JOB_SWEEP_INTERVAL_SECONDS)
+
+
+async def _sweep_jobs():
+    now = datetime.now()
+
+    async with SessionLocal() as db:
+        # Удаляем результаты с истёкшим сроком хранения
+        result = await db.execute(select(JobModel.id).filter(JobModel.expires_at < now))
+        expired = result.scalars().all()
+        if expired:
+            await db.execute(delete(JobModel).filter(JobModel.id.in_(expired)))
+            await db.commit()
+            for job_id in expired:
+                shutil.rmtree(_job_dir(job_id), ignore_errors=True)
+
+        # Подхватываем задачи, которые давно не обновлялись: их воркер перезапустился или упал.
+        # Задачу забирает тот, чьё обновление updated_at прошло первым.
+        stale_before = now - timedelta(seconds=settings.JOB_STALE_SECONDS)
+        result = await db.execute(select(JobModel.id, JobModel.updated_at).filter(
+            JobModel.status.in_(('pending', 'running')),
+            JobModel.updated_at < stale_before,
+        ))
+        for job_id, updated_at in result.all():
+            claimed = await db.execute(update(JobModel).filter(
+                JobModel.id == job_id,
+                JobModel.updated_at == updated_at,
+            ).values(updated_at=now))
+            await db.commit()
+            if not claimed.rowcount:
+                continue
+
+            if os.path.isdir(_job_dir(job_id)):
+                _schedule(job_id)
+            else:
+                await _update_job(
+                    job_id,
+                    status='failed',
+                    error='Job input was lost before the analysis finished.',
+                    expires_at=_expires_at(),
+                )
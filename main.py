@@ -1,24 +1,43 @@
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from users.routes import router as guest_router, user_router
 from auth.route import router as auth_router
+from jobs.routes import router as jobs_router
+from jobs.services import start_job_maintenance, stop_job_maintenance
 from core.security import JWTAuth
-from fastapi import FastAPI, File, UploadFile, Form
+from typing import List, Optional
+from fastapi import FastAPI, File, UploadFile, Form, Query
 from fastapi.requests import Request
 from starlette.middleware.cors import CORSMiddleware
 from starlette.middleware.authentication import AuthenticationMiddleware
-from htmls.process_html import process_html
+from htmls.services import analyze_document, analyze_upload, analyze_batch
+from htmls.process_html import AnalysisMode, OutputMode
+from htmls.ingest import UploadSizeLimitMiddleware
+from core.config import get_settings
+from core.database import engine
+from core.metrics import MetricsMiddleware, metrics
+from htmls.workers import analysis_pool
+from htmls.cache import result_cache
 
 
 
+settings = get_settings()
+
 app = FastAPI()
 app.include_router(guest_router)
 app.include_router(user_router)
 app.include_router(auth_router)
+app.include_router(jobs_router)
 
 origins = ["http://localhost:5173"]
 
 # Add Middleware
 app.add_middleware(AuthenticationMiddleware, backend=JWTAuth())
+app.add_middleware(UploadSizeLimitMiddleware, limits={
+    "/uploadByFile": settings.UPLOAD_MAX_BYTES,
+    "/uploadByRaw": settings.UPLOAD_MAX_BYTES,
+    "/uploadBatch": settings.BATCH_MAX_BYTES,
+    "/jobs": settings.BATCH_MAX_BYTES,
+})
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -26,20 +45,52 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Последним, чтобы в замер попадало время всех остальных middleware
+app.add_middleware(MetricsMiddleware)
+
+@app.on_event('startup')
+async def startup_jobs():
+    start_job_maintenance()
+
+@app.on_event('shutdown')
+async def shutdown():
+    stop_job_maintenance()
+    analysis_pool.shutdown()
+    result_cache.close()
+    await engine.dispose()
 
 @app.get('/')
 def health_check():
     return JSONResponse(content={"status": "Running!"})
 
+@app.get('/metrics', response_class=PlainTextResponse)
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/uploadByFile", response_class=JSONResponse)
-async def upload(request: Request, file: UploadFile = File(...)):
-    html_content = await file.read()
-    res = await process_html(html_content)
+async def upload(
+    request: Request,
+    file: UploadFile = File(...),
+    output: OutputMode = 'prettified',
+    mode: AnalysisMode = 'full',
+    threshold: Optional[float] = Query(None, ge=0, le=1),
+):
+    res = await analyze_upload(file, output, mode, threshold)
 
     return res
 
 @app.post("/uploadByRaw", response_class=JSONResponse)
-async def upload(request: Request, html_content: str = Form(...)):
-    res = await process_html(html_content)
+async def upload(
+    request: Request,
+    html_content: str = Form(...),
+    output: OutputMode = 'prettified',
+    mode: AnalysisMode = 'full',
+    threshold: Optional[float] = Query(None, ge=0, le=1),
+):
+    res = await analyze_document(html_content, output, mode, threshold)
+
+    return res
 
-    return res
\ No newline at end of file
+@app.post("/uploadBatch", response_class=JSONResponse)
+async def upload_batch(request: Request, files: List[UploadFile] = File(...), stream: bool = False, output: OutputMode = 'prettified'):
+    return await analyze_batch(files, stream=stream, output=output)
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, status, Depends, Request
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+from fastapi.exceptions import HTTPException
+from starlette.authentication import UnauthenticatedUser
+from sqlalchemy.ext.asyncio import AsyncSession
 from core.database import get_db
 from users.schemas import CreateUserRequest
 from users.services import create_user_account
@@ -22,7 +24,7 @@ user_router = APIRouter(
 )
 
 @router.post('', status_code=status.HTTP_201_CREATED)
-async def create_user(data: CreateUserRequest, db: Session = Depends(get_db)):
+async def create_user(data: CreateUserRequest, db: AsyncSession = Depends(get_db)):
     await create_user_account(data=data, db=db)
     payload = {"message": "User account has been succesfully created."}
     return JSONResponse(content=payload)
@@ -30,4 +32,11 @@ async def create_user(data: CreateUserRequest, db: Session = Depends(get_db)):
 
 @user_router.post('/me', status_code=status.HTTP_200_OK, response_model=UserResponse)
 def get_user_detail(request: Request):
+    # Заголовок есть, но токен не прошёл проверку - middleware оставил гостя
+    if isinstance(request.user, UnauthenticatedUser):
+        raise HTTPException(
+            status_code=401,
+            detail="Could not validate credentials.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return request.user
\ No newline at end of file
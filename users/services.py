@@ -1,23 +1,25 @@
+from sqlalchemy import select
 from users.models import UserModel
 from fastapi.exceptions import HTTPException
-from core.security import get_password_hash
+from core.security import hash_password_async
 from datetime import datetime
 
 
 async def create_user_account(data, db):
-    user = db.query(UserModel).filter(UserModel.email == data.email).first()
+    result = await db.execute(select(UserModel).filter(UserModel.email == data.email))
+    user = result.scalars().first()
     if user:
         raise HTTPException(status_code=422, detail="Email is already registered with us.")
 
     new_user = UserModel(
         email=data.email,
-        password=get_password_hash(data.password),
+        password=await hash_password_async(data.password),
         is_active=True,
         is_verified=True,
         registered_at=datetime.now(),
         updated_at=datetime.now()
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
\ No newline at end of file